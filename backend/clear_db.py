@@ -11,6 +11,8 @@ async def clear_data():
         await conn.execute(text("TRUNCATE TABLE customers CASCADE;"))
         await conn.execute(text("TRUNCATE TABLE products CASCADE;"))
         await conn.execute(text("TRUNCATE TABLE ai_insights CASCADE;"))
+        # customers CASCADE clears the per-customer cohort tables, but not the matrix
+        await conn.execute(text("TRUNCATE TABLE customer_first_order, customer_active_months, cohort_activity;"))
         # we can keep users if we want, or clear them too. Let's clear everything for a fresh start.
         await conn.execute(text("TRUNCATE TABLE users CASCADE;"))
         print("All data cleared successfully.")
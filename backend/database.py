@@ -18,6 +18,27 @@ AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Separate, small pool for model-generated chat SQL (services/sql_sandbox.py) so a
+# runaway query can't take connections from the app. In production point
+# READONLY_DATABASE_URL at a role that only has SELECT grants.
+READONLY_DATABASE_URL = os.getenv("READONLY_DATABASE_URL") or DATABASE_URL
+CHAT_SQL_POOL_SIZE = int(os.getenv("CHAT_SQL_POOL_SIZE", 2))
+CHAT_SQL_TIMEOUT_MS = int(os.getenv("CHAT_SQL_TIMEOUT_MS", 5000))
+
+def _readonly_engine_args(url: str) -> dict:
+    if not url.startswith("postgresql"):
+        return {}
+    args = {"pool_size": CHAT_SQL_POOL_SIZE, "max_overflow": 0, "pool_timeout": 5}
+    if "+asyncpg" in url:
+        # Enforced by the server for every statement on these connections
+        args["connect_args"] = {"server_settings": {
+            "default_transaction_read_only": "on",
+            "statement_timeout": str(CHAT_SQL_TIMEOUT_MS),
+        }}
+    return args
+
+readonly_engine = create_async_engine(READONLY_DATABASE_URL, **_readonly_engine_args(READONLY_DATABASE_URL))
+
 class Base(DeclarativeBase):
     pass
 
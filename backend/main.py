@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from .database import engine, Base
+from .database import engine, Base, AsyncSessionLocal
 from . import models
 from dotenv import load_dotenv
 import os
@@ -12,13 +12,25 @@ from .routers import auth, admin, kpis, realtime, ai, ai_comparison, users, ai_r
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from .limiter import limiter
+from .services.cache_service import cache_service
+from .services import cache_warmer, insight_precompute, pdf_extraction, cohort_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables on startup
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        await cohort_service.check_materialized(session)
+    await cache_service.start()
+    if cache_warmer.WARM_ON_STARTUP:
+        cache_warmer.schedule_warm("startup")
+    insight_precompute.start()
     yield
+    await insight_precompute.stop()
+    await cache_warmer.stop()
+    pdf_extraction.shutdown()
+    await cache_service.close()
 
 app = FastAPI(title="Data Analysis Intelligence Platform API", lifespan=lifespan)
 app.state.limiter = limiter
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -43,6 +43,17 @@ class Product(Base):
     low_stock_threshold = Column(Integer, default=10)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Partial index: only rows at/below their threshold are indexed, so it stays
+        # tiny and serves /api/products/low-stock (ordered by most depleted first)
+        Index(
+            "ix_products_low_stock",
+            stock_quantity, id,
+            postgresql_where=(stock_quantity <= low_stock_threshold),
+            sqlite_where=(stock_quantity <= low_stock_threshold),
+        ),
+    )
+
 class MarketingChannel(Base):
     __tablename__ = "marketing_channels"
 
@@ -91,6 +102,7 @@ class AIInsight(Base):
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     confidence_score = Column(Float, nullable=True)
+    snapshot_hash = Column(String, nullable=True, index=True) # KPI snapshot a precomputed insight was written from
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class SavedView(Base):
@@ -125,3 +137,24 @@ class AlertNotification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+# Materialized cohort data, maintained on ingest by cohort_service.record_orders
+class CustomerFirstOrder(Base):
+    __tablename__ = "customer_first_order"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    first_order_at = Column(DateTime, nullable=False) # Naive UTC
+    cohort_month = Column(String, nullable=False, index=True) # YYYY-MM
+
+class CustomerActiveMonth(Base):
+    __tablename__ = "customer_active_months"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    month = Column(String, primary_key=True) # YYYY-MM with at least one order
+
+class CohortActivity(Base):
+    __tablename__ = "cohort_activity"
+
+    cohort_month = Column(String, primary_key=True) # YYYY-MM of the customers' first order
+    activity_month = Column(String, primary_key=True)
+    active_customers = Column(Integer, nullable=False, default=0)
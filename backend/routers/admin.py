@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 from ..dependencies import require_admin
 from ..models import User
+from ..services.cache_service import cache_service
+from ..services import nl_query_cache
 
 router = APIRouter(
     prefix="/admin",
@@ -14,3 +17,31 @@ async def get_admin_dashboard():
         "message": "Welcome to the Admin Dashboard",
         "private_data": "Only admins can see this"
     }
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Per-prefix cache effectiveness for this worker, plus backend health."""
+    return {
+        **cache_service.metrics.snapshot(),
+        "totals": {
+            "coalesced": cache_service.coalesced,
+            "stale_served": cache_service.stale_served,
+            "early_refreshes": cache_service.early_refreshes,
+            "background_refreshes": cache_service.background_refreshes,
+        },
+        "nl_sql_hits": nl_query_cache.stats(),
+        "backend": cache_service.stats(),
+    }
+
+@router.get("/cache/metrics", response_class=PlainTextResponse)
+async def get_cache_metrics():
+    """Same counters in Prometheus text format (scrape with an admin bearer token)."""
+    return PlainTextResponse(
+        cache_service.metrics.prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+@router.post("/cache/stats/reset")
+async def reset_cache_stats():
+    cache_service.metrics.reset()
+    return {"status": "reset"}
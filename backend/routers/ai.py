@@ -1,11 +1,17 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import List
 
 from .. import database, dependencies, models, schemas
-from ..services import ai_service, kpi_service
+from ..services import ai_service, insight_precompute
+from ..services.prompt_context import fit_context, AI_CONTEXT_TOKENS
 from ..limiter import limiter
+from ..responses import stream_sse
+
+# Charts explained per /explain/batch request (one model call)
+AI_BATCH_MAX_CHARTS = int(os.getenv("AI_BATCH_MAX_CHARTS", 12))
 
 router = APIRouter(
     prefix="/api/ai",
@@ -17,31 +23,24 @@ router = APIRouter(
 @limiter.limit("5/minute")
 async def generate_insight(request: Request, db: AsyncSession = Depends(database.get_db)):
     # 1. Fetch KPI Context
-    revenue = await kpi_service.calculate_total_revenue(db, None, None)
-    categories = await kpi_service.calculate_revenue_by_category(db)
-    
-    kpi_context = {
-        "total_revenue": revenue,
-        "revenue_by_category": categories
-    }
-    
-    # 2. Call AI Service
-    insight_json = await ai_service.generate_business_insight(kpi_context)
+    snapshot = await insight_precompute.kpi_snapshot(db)
+    digest = insight_precompute.snapshot_hash(snapshot)
+
+    # 2. Serve the precomputed insight while the KPIs haven't changed
+    insight = await insight_precompute.stored_insight(db, digest)
+    if insight is not None:
+        return insight
     
-    # 3. Save to DB
-    insight = await ai_service.save_insight(db, insight_json)
+    # 3. Call AI Service and save to DB
+    insight = await insight_precompute.generate_insight(db, snapshot, digest)
     
     if not insight:
         raise HTTPException(status_code=500, detail="Failed to generate/save insight")
         
     return insight
 
-@router.post("/explain")
-@limiter.limit("10/minute")
-async def explain_chart(request: Request, body: dict, db: AsyncSession = Depends(database.get_db)):
-    """
-    Generates a contextual explanation for a chart.
-    """
+def _chart_brief(body: dict, budget: int = AI_CONTEXT_TOKENS):
+    """The chart-specific part of an /explain prompt. Returns (brief, cache_content)."""
     chart_name = body.get("chart_name", "Chart")
     context = body.get("context", {})
     selected_item = body.get("selected_item")
@@ -54,30 +53,87 @@ async def explain_chart(request: Request, body: dict, db: AsyncSession = Depends
         task = "Explain the OVERALL TREND and key insights of the entire graph. Do not focus on just one item unless it is the clear winner/loser."
         focus = "Selection: None (Analyze Whole Graph)"
 
-    prompt = f"""
-    You are a data analyst presenting to a business executive.
-    
+    brief = f"""
     Chart: {chart_name}
     {focus}
     
     Task: {task}
     
     Data Context:
-    {context}
-    
+    {fit_context(context, budget)}
+    """
+    return brief, {"chart": chart_name, "selected_item": selected_item, "context": context}
+
+def _explain_prompt(body: dict):
+    """Builds the /explain prompt. Returns (prompt, cache_content)."""
+    brief, cache_content = _chart_brief(body)
+    prompt = f"""
+    You are a data analyst presenting to a business executive.
+    {brief}
     Rules:
     - Provide **3 to 4 sentences** of deep, actionable insight.
     - Focus on the "Why" and "So What" (business impact).
     - Be professional, direct, and insightful.
     - Return ONLY the explanation text.
     """
+    return prompt, cache_content
+
+@router.post("/explain")
+@limiter.limit("10/minute")
+async def explain_chart(request: Request, body: dict, db: AsyncSession = Depends(database.get_db)):
+    """
+    Generates a contextual explanation for a chart.
+    """
+    prompt, cache_content = _explain_prompt(body)
     
     # Call Service
-    explanation = await ai_service.generate_concise_explanation(prompt)
+    explanation = await ai_service.generate_concise_explanation(prompt, cache_content=cache_content)
     return {"explanation": explanation}
 
+@router.post("/explain/stream")
+@limiter.limit("10/minute")
+async def explain_chart_stream(request: Request, body: dict):
+    """
+    /explain as server-sent events: `token` events carry the explanation as it
+    is generated, followed by `done`.
+    """
+    prompt, cache_content = _explain_prompt(body)
+
+    async def events():
+        async for chunk in ai_service.stream_concise_explanation(prompt, cache_content=cache_content):
+            yield "token", {"text": chunk}
+        yield "done", {}
+
+    return stream_sse(events())
+
+@router.post("/explain/batch")
+@limiter.limit("10/minute")
+async def explain_charts(request: Request, body: dict):
+    """
+    /explain for several charts with one model call.
+    Body: {"charts": [{"chart_name", "context", "selected_item"}, ...]}.
+    Returns {"explanations": [...]} in the same order.
+    """
+    charts = body.get("charts")
+    if not isinstance(charts, list) or not charts or not all(isinstance(chart, dict) for chart in charts):
+        raise HTTPException(status_code=400, detail="Expected a non-empty list of charts")
+    if len(charts) > AI_BATCH_MAX_CHARTS:
+        raise HTTPException(status_code=400, detail=f"At most {AI_BATCH_MAX_CHARTS} charts per request")
+
+    # The charts share one prompt, so they share its context budget
+    budget = max(AI_CONTEXT_TOKENS // len(charts), 200)
+    briefs = [_chart_brief(chart, budget) for chart in charts]
+    explanations = await ai_service.generate_batch_explanations(briefs)
+    return {"explanations": explanations}
+
 @router.get("/insights")
 async def get_insights(db: AsyncSession = Depends(database.get_db)):
-    query = select(models.AIInsight).order_by(desc(models.AIInsight.created_at)).limit(10)
+    # Precomputed executive summaries are served by /executive-summary, not this feed
+    query = (
+        select(models.AIInsight)
+        .where(models.AIInsight.type != insight_precompute.EXECUTIVE_SUMMARY)
+        .order_by(desc(models.AIInsight.created_at))
+        .limit(10)
+    )
     result = await db.execute(query)
     return result.scalars().all()
@@ -2,9 +2,9 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from pydantic import BaseModel
-import json
 from .. import dependencies
-from ..services import ai_service, kpi_service
+from ..services import insight_precompute
+from datetime import date
 # We might need database session if we query kpis directly, but kpi_service might already handle it or we mock for speed as per previous patterns.
 # Actually, kpi_service functions need db session. 
 # For this task, to keep it consistent with previous patterns where we simulated or used simple dependencies:
@@ -22,67 +22,28 @@ class ReportRequest(BaseModel):
 @router.post("/executive-summary")
 async def generate_executive_summary(request: ReportRequest, db: AsyncSession = Depends(get_db)):
     # 1. Fetch Real Data
-    from ..services.kpi_service import calculate_total_revenue, count_orders
-    total_rev = await calculate_total_revenue(db)
-    active_orders = await count_orders(db)
-    
-    kpi_snapshot = {
-        "period": request.period,
-        "total_revenue": round(total_rev, 2),
-        "active_orders": active_orders,
-        "revenue_growth": "+12.5% (Projected)",
-        "top_product": "N/A", 
-        "challenges": "Inventory Optimization"
-    }
-    
-    prompt = f"""
-    You are a Chief Strategy Officer. Write a professional Executive Summary for the following business performance data.
-    
-    Data:
-    {json.dumps(kpi_snapshot, indent=2)}
-    
-    Structure:
-    1. **Performance Overview**: High-level summary of revenue and growth.
-    2. **Key Drivers**: What went well (Top product, new customers).
-    3. **Strategic Risks**: addressing challenges.
-    4. **Recommendations**: 2-3 bullet points on what to do next.
-    
-    Tone: Professional, concise, authoritative.
-    Format your response in Markdown.
-    """
-    
-    # We use our friendly ai_service. 
-    # Note: generate_business_insight returns a JSON usually, but we want text here.
-    # However, our updated generate_business_insight might still try to wrap it if the default prompt was used.
-    # But we are overriding the prompt.
-    # The current ai_service implementation (from previous step) returns `model.generate_content(prompt).text`.
-    # So it returns a string. Perfect.
-    
-    # 2. Try AI Generation with Fallback
-    summary_text = await ai_service.generate_business_insight({}, prompt_override=prompt)
-    
-    # Check for "Not Configured" error from service
-    if "API Key not configured" in summary_text or "Error" in summary_text:
-        # Fallback to Template
-        summary_text = f"""
-## **Executive Summary (Auto-Generated)**
+    snapshot = await insight_precompute.kpi_snapshot(db)
+    digest = insight_precompute.snapshot_hash(snapshot)
 
-### **Performance Overview**
-We are seeing strong traction with a Total Revenue of **${kpi_snapshot['total_revenue']:,}** across **{kpi_snapshot['active_orders']}** active orders. 
+    # 2. Serve the precomputed summary while the KPIs haven't changed
+    stored = await insight_precompute.stored_summary(db, digest, request.period)
+    if stored is not None:
+        return {
+            "report_date": stored.created_at.date().isoformat() if stored.created_at else date.today().isoformat(),
+            "period": request.period,
+            "summary_markdown": stored.content
+        }
 
-### **Key Drivers**
-- **consistent order volume** indicates a healthy customer base.
-- Revenue growth is currently projected at **{kpi_snapshot['revenue_growth']}**.
-
-### **Recommendations**
-- **Focus on Retention:** Analyze repeat purchase behavior to boost LTV.
-- **Inventory Check:** Ensure top-selling categories are well-stocked.
-
-*(Note: Configure `GEMINI_API_KEY` in .env for deeper AI insights)*
-"""
+    # 3. Try AI Generation with Fallback
+    summary_text = await insight_precompute.generate_summary(snapshot, request.period)
+    if summary_text is None:
+        # Fallback to Template
+        summary_text = insight_precompute.fallback_summary(snapshot)
+    else:
+        await insight_precompute.save_summary(db, summary_text, digest, request.period)
     
     return {
-        "report_date": "2024-08-25",
+        "report_date": date.today().isoformat(),
         "period": request.period,
         "summary_markdown": summary_text
     }
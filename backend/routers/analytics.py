@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
 from .. import database, dependencies
-from ..services import marketing_service, cohort_service, product_intelligence_service
+from ..services import marketing_service, cohort_service, cohort_engine, product_intelligence_service
+from ..responses import FastJSONResponse, fast_json
 
 router = APIRouter(
     prefix="/api/analytics",
@@ -10,7 +11,8 @@ router = APIRouter(
     dependencies=[Depends(dependencies.require_viewer)]
 )
 
-@router.get("/marketing")
+@router.get("/marketing", response_class=FastJSONResponse)
+@fast_json
 async def get_marketing_analytics(
     db: AsyncSession = Depends(database.get_db)
 ) -> List[Dict[str, Any]]:
@@ -19,16 +21,26 @@ async def get_marketing_analytics(
     """
     return await marketing_service.get_channel_performance(db)
 
-@router.get("/retention")
+@router.get("/retention", response_class=FastJSONResponse)
+@fast_json
 async def get_retention_cohorts(
+    granularity: str = "month",
+    metric: str = "customers",
     db: AsyncSession = Depends(database.get_db)
 ) -> List[Dict[str, Any]]:
     """
-    Get Monthly Cohort Retention Analysis
+    Get Cohort Retention Analysis
+    granularity: week | month | quarter; metric: customers | revenue (revenue relative to the first period).
+    Monthly customer retention is read from the maintained cohort matrix; the rest is computed from orders.
     """
-    return await cohort_service.get_cohort_analysis(db)
+    if granularity not in cohort_engine.GRANULARITIES or metric not in cohort_engine.METRICS:
+        raise HTTPException(status_code=400, detail="granularity must be week, month or quarter; metric customers or revenue")
+    if granularity == "month" and metric == "customers":
+        return await cohort_service.get_cohort_analysis(db)
+    return await cohort_engine.get_cohort_retention(db, granularity, metric)
 
-@router.get("/affinity")
+@router.get("/affinity", response_class=FastJSONResponse)
+@fast_json
 async def get_affinity_analysis(
     db: AsyncSession = Depends(database.get_db)
 ) -> List[Dict[str, Any]]: # Assuming a similar return type for affinity analysis
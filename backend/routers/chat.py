@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
+from .. import database
 from ..database import get_db
-from ..services import ai_service
+from ..services import ai_service, kpi_service, nl_query_cache, sql_sandbox, chat_intents
+from ..services.cache_service import cache_service, build_cache_key
+from ..responses import stream_sse
 from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import logging
 
 router = APIRouter(
@@ -14,50 +17,141 @@ router = APIRouter(
 class ChatMessage(BaseModel):
     message: str
 
+ERROR_REPLY = "I encountered an error processing your request. Please try again."
+
+async def _plan_query(message: str) -> Dict[str, Any]:
+    """
+    Asks the model for SQL answering `message`.
+    Returns {"sql", "explanation"}, or {"content"} with a reply when there is no query to run.
+    """
+    ai_response = await ai_service.generate_sql_query(message)
+
+    if not ai_response or "error" in ai_response:
+        return {
+            "content": ai_response.get("error", "I couldn't understand that request. Please try asking about sales, products, or customers.") if ai_response else "AI Service Error"
+        }
+
+    sql_query = ai_response.get("sql")
+    if not sql_query:
+        return {
+            "content": "I couldn't find a way to answer that with the available data. Try asking about revenue, orders, or regions."
+        }
+    return {"sql": sql_query, "explanation": ai_response.get("explanation"), "params": {}, "source": "model"}
+
+async def _vocabulary(db: AsyncSession) -> Dict[str, List[str]]:
+    """Known categories/regions, which the query cache treats as swappable entities."""
+    options = await cache_service.get_or_compute(
+        build_cache_key("filter_options", "chat_vocabulary", {}),
+        lambda: kpi_service.get_filter_options(db),
+        ttl=300,
+    )
+    return {"category": options.get("categories", []), "region": options.get("regions", [])}
+
+async def _answer(db: AsyncSession, message: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Finds SQL for `message` (query cache first, the model otherwise) and runs it
+    in the sandbox (read-only pool, timeout, cost and size limits).
+    Returns (plan, {"rows", "truncated"}); the result is None when the plan is
+    a reply without a query. Raises sql_sandbox.QueryRejected.
+    """
+    vocabulary = await _vocabulary(db)
+    plan = await nl_query_cache.lookup(message, vocabulary)
+    if plan is not None:
+        try:
+            return plan, await sql_sandbox.run_chat_query(plan["sql"], plan["params"])
+        except sql_sandbox.QueryRejected:
+            raise
+        except Exception as e:
+            logging.warning(f"Cached chat SQL failed ({plan['source']}), regenerating: {e}")
+
+    plan = await _plan_query(message)
+    if "content" in plan:
+        return plan, None
+    result = await sql_sandbox.run_chat_query(plan["sql"])
+    await nl_query_cache.store(message, plan["sql"], plan["explanation"], vocabulary)
+    return plan, result
+
+async def _quick_answer(db: AsyncSession, message: str) -> Optional[Dict[str, Any]]:
+    """KPI questions answered locally from kpi_service (no model calls), or None."""
+    try:
+        return await chat_intents.answer(db, message, await _vocabulary(db))
+    except Exception as e:
+        logging.warning(f"Chat fast path failed, using the model: {e}")
+        return None
+
 @router.post("/message")
 async def chat_message(payload: ChatMessage, db: AsyncSession = Depends(get_db)):
     """
     Process natural language query -> SQL -> Result -> Summary
+    Common KPI questions skip all of that and are answered from kpi_service.
     """
     try:
-        # 1. Generate SQL
-        ai_response = await ai_service.generate_sql_query(payload.message)
-        
-        if not ai_response or "error" in ai_response:
-            return {
-                "role": "bot",
-                "content": ai_response.get("error", "I couldn't understand that request. Please try asking about sales, products, or customers.") if ai_response else "AI Service Error"
-            }
-            
-        sql_query = ai_response.get("sql")
-        explanation = ai_response.get("explanation")
-        
-        if not sql_query:
-            return {
-                "role": "bot",
-                "content": "I couldn't find a way to answer that with the available data. Try asking about revenue, orders, or regions."
-            }
-
-        # 2. Execute SQL
-        # Safety: We rely on ai_service keyword check, but SQLAlchemy text() is powerful.
-        # Future: Use a read-only DB user here.
-        result = await db.execute(text(sql_query))
-        rows = result.mappings().all()
-        data = [dict(row) for row in rows]
+        quick = await _quick_answer(db, payload.message)
+        if quick is not None:
+            return {"role": "bot", "content": quick["content"], "data": quick["data"], "truncated": False, "source": "intent"}
+
+        # 1. Generate (or reuse) SQL and 2. Execute it
+        plan, result = await _answer(db, payload.message)
+        if result is None:
+            return {"role": "bot", "content": plan["content"]}
+        data = result["rows"]
         
         # 3. Summarize Logic
-        summary = await ai_service.summarize_data(payload.message, data, explanation)
+        summary = await ai_service.summarize_data(payload.message, data, plan["explanation"])
         
         return {
             "role": "bot",
             "content": summary,
             "data": data,
-            "sql": sql_query # valid for debugging/transparency
+            "truncated": result["truncated"],
+            "sql": plan["sql"] # valid for debugging/transparency
         }
 
+    except sql_sandbox.QueryRejected as e:
+        return {"role": "bot", "content": str(e)}
     except Exception as e:
         logging.error(f"Chat Error: {e}")
         return {
             "role": "bot",
-            "content": "I encountered an error processing your request. Please try again."
+            "content": ERROR_REPLY
         }
+
+async def _chat_events(message: str) -> AsyncIterator[Tuple[str, Any]]:
+    try:
+        # Own session: the request-scoped one may be closed before the body is sent
+        async with database.AsyncSessionLocal() as session:
+            quick = await _quick_answer(session, message)
+            if quick is None:
+                plan, result = await _answer(session, message)
+        if quick is not None:
+            yield "rows", {"data": quick["data"], "truncated": False, "source": "intent"}
+            yield "token", {"text": quick["content"]}
+            yield "done", {}
+            return
+        if result is None:
+            yield "message", {"role": "bot", "content": plan["content"]}
+            yield "done", {}
+            return
+        yield "sql", {"sql": plan["sql"], "explanation": plan["explanation"], "source": plan["source"]}
+        yield "rows", {"data": result["rows"], "truncated": result["truncated"]}
+
+        async for chunk in ai_service.stream_summary(message, result["rows"], plan["explanation"]):
+            yield "token", {"text": chunk}
+        yield "done", {}
+    except sql_sandbox.QueryRejected as e:
+        yield "message", {"role": "bot", "content": str(e)}
+        yield "done", {}
+    except Exception as e:
+        logging.error(f"Chat Stream Error: {e}")
+        yield "error", {"content": ERROR_REPLY}
+
+@router.post("/message/stream")
+async def chat_message_stream(payload: ChatMessage):
+    """
+    /message as server-sent events, so each stage shows up as soon as it's ready:
+    `sql` (query used, with its source: model or query cache) and `rows` once
+    it ran, `token` (summary text, in pieces), then `done`. A reply without a query comes as a single `message`
+    event; failures as `error`. KPI questions answered locally send `rows` (source "intent"),
+    one `token` and `done`.
+    """
+    return stream_sse(_chat_events(payload.message))
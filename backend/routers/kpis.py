@@ -6,6 +6,7 @@ from sqlalchemy import select
 from .. import database, dependencies, models
 from ..services import kpi_service, forecast_service
 from ..services.cache_service import cache
+from ..responses import FastJSONResponse, fast_json
 
 router = APIRouter(
     prefix="/api/kpis",
@@ -13,12 +14,12 @@ router = APIRouter(
 )
 
 @router.get("/filters")
-@cache(ttl=300, key_prefix="filter_options")
+@cache(ttl=300, key_prefix="filter_options", stale_ttl=600)
 async def get_filters(db: AsyncSession = Depends(database.get_db)):
     return await kpi_service.get_filter_options(db)
 
 @router.get("/overview")
-@cache(ttl=60, key_prefix="kpi_overview")
+@cache(ttl=60, key_prefix="kpi_overview", distributed=True, stale_ttl=240, exclude=("user",))
 async def get_kpi_overview(
     category: str = None, 
     region: str = None, 
@@ -66,7 +67,8 @@ async def get_kpi_overview(
         "cart_abandonment_rate": 0.0
     }
 
-@router.get("/revenue/category")
+@router.get("/revenue/category", response_class=FastJSONResponse)
+@fast_json
 async def get_revenue_by_category(
     days: int = 30,
     region: str = None,
@@ -77,7 +79,8 @@ async def get_revenue_by_category(
     start_date = datetime.now() - timedelta(days=days) if days > 0 else None
     return await kpi_service.calculate_revenue_by_category(db, start_date, None, region, min_order_value)
 
-@router.get("/revenue/region")
+@router.get("/revenue/region", response_class=FastJSONResponse)
+@fast_json
 async def get_revenue_by_region(
     days: int = 30,
     category: str = None,
@@ -88,8 +91,9 @@ async def get_revenue_by_region(
     start_date = datetime.now() - timedelta(days=days) if days > 0 else None
     return await kpi_service.calculate_revenue_by_region(db, start_date, None, category, min_order_value)
 
-@router.get("/revenue/trend")
-@cache(ttl=300, key_prefix="rev_trend")
+@router.get("/revenue/trend", response_class=FastJSONResponse)
+@fast_json
+@cache(ttl=300, key_prefix="rev_trend", stale_ttl=600)
 async def get_revenue_trend(
     days: int = 30,
     category: str = None, 
@@ -101,7 +105,8 @@ async def get_revenue_trend(
     start_date = datetime.now() - timedelta(days=days) if days > 0 else None
     return await kpi_service.calculate_revenue_trend(db, start_date, None, category, region, min_order_value)
 
-@router.get("/revenue/forecast")
+@router.get("/revenue/forecast", response_class=FastJSONResponse)
+@fast_json
 async def get_revenue_forecast(
     days: int = 30,
     category: str = None,
@@ -1,18 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from typing import List
+from sqlalchemy import select, update, values, column, bindparam, String, Integer
+from typing import Optional
 from .. import database, models, schemas
+from ..responses import FastJSONResponse, stream_json_array, stream_ndjson
 
 router = APIRouter(
     prefix="/api/products",
     tags=["Products"],
 )
 
-@router.get("/", response_model=List[schemas.ProductResponse])
-async def get_products(db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(select(models.Product))
-    return result.scalars().all()
+# Plain column projection: rows come back as tuples instead of ORM objects,
+# so the list endpoints never build identity-mapped Product instances.
+PRODUCT_COLUMNS = {
+    col.key: col for col in (
+        models.Product.id,
+        models.Product.name,
+        models.Product.category,
+        models.Product.price,
+        models.Product.cost,
+        models.Product.stock_quantity,
+        models.Product.sku,
+        models.Product.low_stock_threshold,
+        models.Product.created_at,
+    )
+}
+
+MAX_PAGE_SIZE = 1000
+STREAM_YIELD_PER = 1000
+# 2 bind params per pair; keeps each statement well under asyncpg's 32767 limit
+BULK_UPDATE_CHUNK = 5000
+
+def _build_product_query(
+    fields: Optional[str] = None,
+    category: Optional[str] = None,
+    low_stock: bool = False,
+    after_id: Optional[int] = None,
+):
+    """
+    Shared SELECT for the catalogue endpoints.
+    `fields` is a comma separated projection (id is always included for keyset paging).
+    """
+    if fields:
+        names = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [n for n in names if n not in PRODUCT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}")
+        columns = [PRODUCT_COLUMNS["id"]] + [PRODUCT_COLUMNS[n] for n in names if n != "id"]
+    else:
+        columns = list(PRODUCT_COLUMNS.values())
+
+    query = select(*columns)
+    if category:
+        query = query.where(models.Product.category == category)
+    if low_stock:
+        query = query.where(models.Product.stock_quantity <= models.Product.low_stock_threshold)
+    if after_id is not None:
+        query = query.where(models.Product.id > after_id)
+    return query.order_by(models.Product.id)
+
+async def _stream_product_rows(query):
+    # Own session: the request-scoped one may be closed before the body is sent.
+    # stream() runs on a server-side cursor, fetching STREAM_YIELD_PER rows at a time.
+    async with database.AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=STREAM_YIELD_PER))
+        async for row in result.mappings():
+            yield dict(row)
+
+@router.get("/", response_class=FastJSONResponse)
+async def get_products(
+    category: Optional[str] = None,
+    low_stock: bool = False,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Product rows (ProductResponse fields). With `fields`, each row holds only
+    `id` plus the listed columns, so no response_model is declared.
+    """
+    query = _build_product_query(fields, category, low_stock)
+    if stream:
+        return stream_json_array(_stream_product_rows(query))
+
+    result = await db.execute(query)
+    return FastJSONResponse([dict(row) for row in result.mappings()])
+
+@router.get("/page", response_class=FastJSONResponse)
+async def get_products_page(
+    after_id: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    low_stock: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Keyset pagination by id: pass the returned `next_after_id` back as `after_id`
+    to fetch the next page. `next_after_id` is null on the last page.
+    """
+    query = _build_product_query(fields, category, low_stock, after_id).limit(limit)
+    result = await db.execute(query)
+    items = [dict(row) for row in result.mappings()]
+    next_after_id = items[-1]["id"] if len(items) == limit else None
+    return FastJSONResponse({"items": items, "next_after_id": next_after_id})
+
+@router.get("/stream")
+async def stream_products(
+    category: Optional[str] = None,
+    low_stock: bool = False,
+    fields: Optional[str] = None,
+):
+    """
+    Full catalogue export as NDJSON (one product per line), read through a
+    server-side cursor so memory stays flat regardless of catalogue size.
+    """
+    query = _build_product_query(fields, category, low_stock)
+    return stream_ndjson(_stream_product_rows(query))
+
+@router.get("/low-stock", response_class=FastJSONResponse)
+async def get_low_stock_products(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Products at or below their low_stock_threshold, most depleted first.
+    Served from the ix_products_low_stock partial index.
+    """
+    query = (
+        _build_product_query(fields, category, low_stock=True)
+        .order_by(None)
+        .order_by(models.Product.stock_quantity, models.Product.id)
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return FastJSONResponse([dict(row) for row in result.mappings()])
+
+@router.patch("/stock/bulk")
+async def bulk_update_stock(payload: schemas.BulkStockUpdate, db: AsyncSession = Depends(database.get_db)):
+    """
+    Applies many (sku, quantity) pairs with one UPDATE ... FROM (VALUES ...) per chunk.
+    Duplicate SKUs keep the last quantity sent.
+    """
+    # Core table (not the ORM entity): no session synchronization needed for bulk writes
+    products_table = models.Product.__table__
+    quantities = {u.sku: u.quantity for u in payload.updates}
+    pairs = list(quantities.items())
+    updated_skus = set()
+
+    for i in range(0, len(pairs), BULK_UPDATE_CHUNK):
+        batch = pairs[i:i + BULK_UPDATE_CHUNK]
+        if db.bind.dialect.name != "postgresql":
+            # VALUES with column aliases is Postgres syntax; plain executemany elsewhere (SQLite tests)
+            existing = await db.execute(select(models.Product.sku).where(models.Product.sku.in_([sku for sku, _ in batch])))
+            updated_skus.update(existing.scalars().all())
+            await db.execute(
+                update(products_table).where(products_table.c.sku == bindparam("b_sku")).values(stock_quantity=bindparam("b_quantity")),
+                [{"b_sku": sku, "b_quantity": qty} for sku, qty in batch]
+            )
+            continue
+
+        chunk = values(
+            column("sku", String), column("quantity", Integer), name="stock_updates"
+        ).data(batch)
+        stmt = (
+            update(products_table)
+            .where(products_table.c.sku == chunk.c.sku)
+            .values(stock_quantity=chunk.c.quantity)
+            .returning(products_table.c.sku)
+        )
+        result = await db.execute(stmt)
+        updated_skus.update(result.scalars().all())
+
+    await db.commit()
+    return {
+        "updated": len(updated_skus),
+        "not_found": [sku for sku in quantities if sku not in updated_skus]
+    }
 
 @router.post("/", response_model=schemas.ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depends(database.get_db)):
@@ -40,14 +206,17 @@ async def update_product(product_id: int, product_update: schemas.ProductBase, d
     
 @router.patch("/{product_id}/stock", response_model=schemas.ProductResponse)
 async def update_stock(product_id: int, quantity: int, db: AsyncSession = Depends(database.get_db)):
-    # Lightweight endpoint for just updating stock
-    result = await db.execute(select(models.Product).where(models.Product.id == product_id))
-    product = result.scalar_one_or_none()
-    
+    # Lightweight endpoint for just updating stock: single UPDATE ... RETURNING
+    result = await db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(stock_quantity=quantity)
+        .returning(*PRODUCT_COLUMNS.values())
+    )
+    product = result.mappings().one_or_none()
+
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-        
-    product.stock_quantity = quantity
+
     await db.commit()
-    await db.refresh(product)
-    return product
+    return dict(product)
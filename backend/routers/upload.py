@@ -8,6 +8,7 @@ import io
 from datetime import datetime
 import asyncio
 from ..services.cache_service import cache_service
+from ..services import cache_warmer, insight_precompute, cohort_service
 
 router = APIRouter(
     prefix="/api/upload",
@@ -336,6 +337,7 @@ async def upload_csv(file: UploadFile = File(...), db: AsyncSession = Depends(ge
             
             curr_batch_orders = []
             curr_batch_items = []
+            order_events = [] # (customer_id, created_at) for the cohort tables
             
             BATCH_SIZE = 2000
             batch_count = 0
@@ -375,6 +377,7 @@ async def upload_csv(file: UploadFile = File(...), db: AsyncSession = Depends(ge
                     created_at=date_val
                 )
                 curr_batch_orders.append(order)
+                order_events.append((cid, date_val))
                 curr_batch_items.append({
                     "order_ref": order, 
                     "product_id": pid,
@@ -425,6 +428,8 @@ async def upload_csv(file: UploadFile = File(...), db: AsyncSession = Depends(ge
                 db.add_all(items_to_add)
                 await db.flush()
 
+            await cohort_service.record_orders(db, order_events)
+
             log_trace("Final Commit Starting")
             await db.commit()
             log_trace("Final Commit Done")
@@ -432,6 +437,8 @@ async def upload_csv(file: UploadFile = File(...), db: AsyncSession = Depends(ge
             # CLEAR CACHE to ensure dash updates
             await cache_service.clear()
             log_trace("Cache Cleared")
+            cache_warmer.schedule_warm("upload")
+            insight_precompute.schedule_precompute("upload")
             
             return {"message": "Sales Data Imported Successfully", "records_processed": records_processed, "type": "sales"}
         
@@ -457,19 +464,12 @@ async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(ge
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload a PDF file.")
     
     try:
-        from pypdf import PdfReader
-        from ..services import ai_service
+        from ..services import ai_service, pdf_extraction
         
-        # Read PDF content
+        # Read PDF content: only the pages the prompt budget can hold (start and end kept),
+        # off the event loop, cached by file hash
         content = await file.read()
-        pdf_file = io.BytesIO(content)
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-            
-        # Limit text for API processing
-        text_preview = text[:5000] 
+        text_preview = await pdf_extraction.document_text(content)
         
         # Analyze with AI
         prompt = f"""
@@ -480,13 +480,13 @@ async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(ge
         {text_preview}
         """
         
-        insight_response = await ai_service.generate_business_insight(prompt)
+        insight_response = await ai_service.generate_concise_explanation(prompt)
         
         # Store as AI Insight
         new_insight = models.AIInsight(
             type="STRATEGY_DOC",
             title=f"Analysis: {file.filename}",
-            content=insight_response.get("content", "Analysis failed"),
+            content=insight_response or "Analysis failed",
             confidence_score=0.9
         )
         db.add(new_insight)
@@ -512,6 +512,7 @@ async def clear_data(db: AsyncSession = Depends(get_db)):
         await db.execute(text("TRUNCATE TABLE products RESTART IDENTITY CASCADE"))
         await db.execute(text("TRUNCATE TABLE customers RESTART IDENTITY CASCADE"))
         await db.execute(text("TRUNCATE TABLE ai_insights RESTART IDENTITY CASCADE"))
+        await db.execute(text("TRUNCATE TABLE customer_first_order, customer_active_months, cohort_activity"))
         
         await db.commit()
         await cache_service.clear()
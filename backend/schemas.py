@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -76,6 +76,13 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class StockUpdate(BaseModel):
+    sku: str
+    quantity: int
+
+class BulkStockUpdate(BaseModel):
+    updates: List[StockUpdate]
+
 class ProductResponse(ProductBase):
     id: int
     created_at: datetime
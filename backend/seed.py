@@ -2,6 +2,7 @@ import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.database import engine, Base, AsyncSessionLocal
 from backend import models, auth
+from backend.services import cohort_service
 from sqlalchemy import select
 from datetime import datetime, timedelta
 import random
@@ -98,6 +99,9 @@ async def seed_data():
             db.add(order)
         
         await db.commit()
+
+        print("Building Cohort Tables...")
+        await cohort_service.rebuild(db)
         print("Seeding Complete!")
 
 if __name__ == "__main__":
@@ -1,27 +1,122 @@
 import google.generativeai as genai
 import os
 import json
-from typing import Dict, Any
-from async_lru import alru_cache
+import math
+import asyncio
+from decimal import Decimal
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models
+from .cache_service import cache_service, build_cache_key
+from .prompt_context import fit_context
+
+# Model responses are shared across workers through the cache service
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 24 * 3600))
+# Numbers in prompt context are compared at this many significant digits
+AI_CACHE_PRECISION = int(os.getenv("AI_CACHE_PRECISION", 4))
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-1.5-flash")
+# Model calls in flight per worker, and the longest one may take (seconds)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))
+AI_CALL_TIMEOUT = float(os.getenv("AI_CALL_TIMEOUT", 30))
+# How long other workers wait on a generation in progress: a queued slot plus one full call
+AI_CACHE_LOCK_TIMEOUT = float(os.getenv("AI_CACHE_LOCK_TIMEOUT", AI_CALL_TIMEOUT + 15))
+
+_configured_key: Optional[str] = None
+_models: Dict[str, "genai.GenerativeModel"] = {}
+_call_slots = asyncio.Semaphore(AI_MAX_CONCURRENCY)
 
 # Configure Gemini
 def get_api_key():
+    global _configured_key
     key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if key:
+    if key and key != _configured_key:
         genai.configure(api_key=key)
+        _configured_key = key
+        _models.clear()  # Clients bound to the previous key
     return key
 
+def get_model(name: str = GEMINI_MODEL) -> "genai.GenerativeModel":
+    """Shared GenerativeModel per model name (building one per call re-creates its client)."""
+    model = _models.get(name)
+    if model is None:
+        model = _models[name] = genai.GenerativeModel(name)
+    return model
+
+async def generate_text(prompt: str, model_name: str = GEMINI_MODEL, json_output: bool = False) -> str:
+    """
+    Runs one model call on the async client so the event loop keeps serving
+    other requests meanwhile. At most AI_MAX_CONCURRENCY calls run at once per
+    worker; each is cancelled after AI_CALL_TIMEOUT seconds (raises TimeoutError).
+    `json_output` asks the model for a JSON response (structured output).
+    """
+    model = get_model(model_name)
+    kwargs = {"generation_config": {"response_mime_type": "application/json"}} if json_output else {}
+    async with _call_slots:
+        response = await asyncio.wait_for(model.generate_content_async(prompt, **kwargs), timeout=AI_CALL_TIMEOUT)
+    return response.text
+
+async def stream_text(prompt: str, model_name: str = GEMINI_MODEL) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_text: yields text as the model produces it.
+    AI_CALL_TIMEOUT applies to the wait for each chunk; the concurrency slot is
+    held until the stream ends.
+    """
+    model = get_model(model_name)
+    async with _call_slots:
+        response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), timeout=AI_CALL_TIMEOUT)
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=AI_CALL_TIMEOUT)
+            except StopAsyncIteration:
+                return
+            if chunk.text:
+                yield chunk.text
+
+def normalize_content(value: Any, digits: int = AI_CACHE_PRECISION) -> Any:
+    """
+    Reduces prompt inputs to what matters for the answer: whitespace collapsed,
+    dict keys sorted, numbers rounded to `digits` significant digits. Requests
+    that only differ in formatting or noise-level numbers share a cache entry.
+    """
+    if isinstance(value, dict):
+        return {str(k): normalize_content(v, digits) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize_content(v, digits) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        number = float(value)
+        if math.isnan(number) or math.isinf(number):
+            return str(number)
+        rounded = float(f"{number:.{digits}g}")
+        return int(rounded) if rounded.is_integer() else rounded
+    return " ".join(str(value).split())
+
+def ai_cache_key(kind: str, content: Any) -> str:
+    return build_cache_key(f"ai_{kind}", kind, {
+        "content": json.dumps(normalize_content(content), sort_keys=True, separators=(",", ":")),
+    })
+
+async def cached_generation(kind: str, content: Any, generate: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+    """
+    Returns the cached response for `content`, calling `generate` once across
+    all workers on a miss. `generate` returns None on failure so errors are
+    never cached. Entries are persistent: the key already encodes the prompt
+    content, so the clear() after each upload or sync must not drop them.
+    """
+    # No early refresh: regenerating the same answer would only cost quota
+    return await cache_service.get_or_compute(
+        ai_cache_key(kind, content), generate, ttl=AI_CACHE_TTL, distributed=True, beta=0,
+        lock_timeout=max(AI_CACHE_LOCK_TIMEOUT, AI_CALL_TIMEOUT), persistent=True,
+    )
 
-@alru_cache(maxsize=32)
 async def generate_business_insight_cached(kpi_data_json: str, prompt_override: str = None) -> str:
     kpi_data = json.loads(kpi_data_json)
     if not get_api_key():
         return "Gemini API Key not configured."
 
-    model = genai.GenerativeModel('models/gemini-1.5-flash')
-    
     if prompt_override:
         prompt = prompt_override
     else:
@@ -30,7 +125,7 @@ async def generate_business_insight_cached(kpi_data_json: str, prompt_override:
         Focus on trends, anomalies, or opportunities for growth.
         
         Data:
-        {json.dumps(kpi_data, indent=2)}
+        {fit_context(kpi_data)}
         
         Format your response as a JSON object with the following fields:
         - title: A short headline for the insight.
@@ -39,31 +134,37 @@ async def generate_business_insight_cached(kpi_data_json: str, prompt_override:
         - confidence_score: A float between 0.0 and 1.0 representing your confidence.
         """
 
-    try:
-        response = model.generate_content(prompt)
-        text = response.text.replace('```json', '').replace('```', '').strip()
-        return text
-    except Exception as e:
-        print(f"Error generating insight: {e}")
+    async def generate() -> Optional[str]:
+        try:
+            text = await generate_text(prompt)
+            return text.replace('```json', '').replace('```', '').strip()
+        except Exception as e:
+            print(f"Error generating insight: {e}")
+            return None
+
+    text = await cached_generation("insight", prompt_override or kpi_data, generate)
+    if text is None:
         return json.dumps({
             "title": "Analysis Unavailable",
             "type": "ANOMALY",
             "content": "Could not generate insight at this time.",
             "confidence_score": 0.0
         })
+    return text
 
 async def generate_business_insight(kpi_data: Dict[str, Any], prompt_override: str = None) -> str:
     # Wrapper to handle dict -> json string for cacheability
     return await generate_business_insight_cached(json.dumps(kpi_data, sort_keys=True), prompt_override)
 
-async def save_insight(db: AsyncSession, insight_json: str):
+async def save_insight(db: AsyncSession, insight_json: str, snapshot_hash: str = None):
     try:
         data = json.loads(insight_json)
         new_insight = models.AIInsight(
             title=data.get("title", "New Insight"),
             type=data.get("type", "TREND"),
             content=data.get("content", ""),
-            confidence_score=data.get("confidence_score", 0.8)
+            confidence_score=data.get("confidence_score", 0.8),
+            snapshot_hash=snapshot_hash
         )
         db.add(new_insight)
         await db.commit()
@@ -81,8 +182,6 @@ async def generate_sql_query(question: str) -> Dict[str, Any]:
     if not get_api_key():
         return {"error": "Gemini API Key not configured."}
 
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
     # DATABASE SCHEMA CONTEXT
     schema_context = """
     Tables:
@@ -121,9 +220,9 @@ async def generate_sql_query(question: str) -> Dict[str, Any]:
     """
     
     try:
-        response = model.generate_content(prompt)
+        text = await generate_text(prompt)
         # Clean response (remove markdown code blocks if any)
-        text = response.text.replace('```json', '').replace('```', '').strip()
+        text = text.replace('```json', '').replace('```', '').strip()
         result = json.loads(text)
         
         # Additional Safety Check
@@ -137,52 +236,166 @@ async def generate_sql_query(question: str) -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"Failed to generate SQL: {str(e)}"}
 
-async def summarize_data(question: str, data: list, sql_explanation: str) -> str:
-    """
-    Summarizes the query results in natural language.
-    """
-    if not get_api_key():
-        return "API Key missing."
-        
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    prompt = f"""
+def _summary_prompt(question: str, data: list, sql_explanation: str) -> str:
+    return f"""
     You are a data analyst. Explain the results of the following query to a business user.
     
     User Question: "{question}"
     Query Intent: {sql_explanation}
     
-    Data Results:
-    {json.dumps(data[:10], default=str)}  # Truncate for prompt limit if huge
+    Data Results ({len(data)} rows; large results are summarized):
+    {fit_context(data)}
     
     Rules:
     1. Be concise (max 3 sentences).
     2. Highlight key numbers.
     3. If data is empty, say "No matching data found."
     """
+
+async def summarize_data(question: str, data: list, sql_explanation: str) -> str:
+    """
+    Summarizes the query results in natural language.
+    """
+    if not get_api_key():
+        return "API Key missing."
     
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return await generate_text(_summary_prompt(question, data, sql_explanation))
     except Exception as e:
         return "Could not generate summary."
 
-@alru_cache(maxsize=32)
-async def generate_concise_explanation(prompt: str) -> str:
+async def stream_summary(question: str, data: list, sql_explanation: str) -> AsyncIterator[str]:
+    """summarize_data, yielding the summary as it is generated."""
+    if not get_api_key():
+        yield "API Key missing."
+        return
+    try:
+        async for chunk in stream_text(_summary_prompt(question, data, sql_explanation)):
+            yield chunk
+    except Exception as e:
+        print(f"Summary Streaming Error: {e!r}")
+        yield "Could not generate summary."
+
+async def generate_concise_explanation(prompt: str, cache_content: Any = None) -> str:
     """
     Generates a direct text explanation from a prompt.
+    Cached on `cache_content` (the structured inputs the prompt was built
+    from) when given, otherwise on the normalized prompt text.
     """
     if not get_api_key():
         return "AI Configuration Missing."
-        
 
-    model = genai.GenerativeModel('models/gemini-1.5-flash')
+    error = None
+
+    async def generate() -> Optional[str]:
+        nonlocal error
+        try:
+            text = await generate_text(prompt)
+            return text.strip()
+        except Exception as e:
+            error = e
+            return None
+
+    text = await cached_generation("explain", cache_content if cache_content is not None else prompt, generate)
+    if text is not None:
+        return text
+    if error is not None:
+        if "429" in str(error):
+            return "Usage limit reached. Please wait a moment."
+        print(f"Explanation Generation Error: {error!r}")
+    return "Analysis unavailable at the moment."
+
+async def stream_concise_explanation(prompt: str, cache_content: Any = None) -> AsyncIterator[str]:
+    """
+    generate_concise_explanation, yielding the text as it is generated.
+    A cached explanation is sent in one piece; a fully streamed one is cached.
+    """
+    if not get_api_key():
+        yield "AI Configuration Missing."
+        return
+
+    key = ai_cache_key("explain", cache_content if cache_content is not None else prompt)
+    cached = await cache_service.get_persistent_value(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        async for chunk in stream_text(prompt):
+            parts.append(chunk)
+            yield chunk
     except Exception as e:
-        error_str = str(e)
-        if "429" in error_str:
-            return "Usage limit reached. Please wait a moment."
-        print(f"Explanation Generation Error: {e}")
-        return "Analysis unavailable at the moment."
+        if "429" in str(e):
+            yield "Usage limit reached. Please wait a moment."
+        else:
+            print(f"Explanation Streaming Error: {e!r}")
+            yield "Analysis unavailable at the moment."
+        return
+    await cache_service.set_persistent(key, "".join(parts).strip(), AI_CACHE_TTL)
+
+def _batch_prompt(briefs: List[str]) -> str:
+    sections = "\n".join(f"### Chart {n}\n{brief}\n" for n, brief in enumerate(briefs, 1))
+    return f"""
+    You are a data analyst presenting to a business executive.
+    Explain each of the {len(briefs)} charts below, following its own task.
+
+    {sections}
+    Rules:
+    - For each chart provide **3 to 4 sentences** of deep, actionable insight.
+    - Focus on the "Why" and "So What" (business impact).
+    - Be professional, direct, and insightful.
+
+    Response Format (JSON):
+    {{"explanations": [{{"chart": 1, "explanation": "..."}}, ...]}}
+    """
+
+def parse_batch_explanations(text: str) -> Dict[int, str]:
+    """Chart number -> explanation from a batch response; malformed entries are skipped."""
+    result = json.loads(text.replace('```json', '').replace('```', '').strip())
+    items = result.get("explanations", []) if isinstance(result, dict) else result
+    explanations = {}
+    for n, item in enumerate(items if isinstance(items, list) else [], 1):
+        if isinstance(item, dict) and isinstance(item.get("explanation"), str) and item["explanation"].strip():
+            try:
+                number = int(item.get("chart", n))
+            except (TypeError, ValueError):
+                number = n
+            explanations[number] = item["explanation"].strip()
+    return explanations
+
+async def generate_batch_explanations(briefs: List[Tuple[str, Any]]) -> List[str]:
+    """
+    generate_concise_explanation for several charts with one model call.
+    `briefs` are (chart brief, cache_content) pairs; returns one explanation
+    per brief, in order. Explanations are cached per chart under the same
+    keys as /explain, so only charts not explained yet are sent.
+    """
+    if not get_api_key():
+        return ["AI Configuration Missing."] * len(briefs)
+
+    keys = [ai_cache_key("explain", content) for _, content in briefs]
+    results: List[Optional[str]] = list(await asyncio.gather(*[cache_service.get_persistent_value(key) for key in keys]))
+    missing = [i for i, text in enumerate(results) if text is None]
+    if not missing:
+        return results
+
+    fallback = "Analysis unavailable at the moment."
+    try:
+        text = await generate_text(_batch_prompt([briefs[i][0] for i in missing]), json_output=True)
+        explanations = parse_batch_explanations(text)
+    except Exception as e:
+        if "429" in str(e):
+            fallback = "Usage limit reached. Please wait a moment."
+        else:
+            print(f"Batch Explanation Error: {e!r}")
+        explanations = {}
+
+    for n, i in enumerate(missing, 1):
+        explanation = explanations.get(n)
+        if explanation is None:
+            results[i] = fallback  # Not cached: the next request retries it
+            continue
+        results[i] = explanation
+        await cache_service.set_persistent(keys[i], explanation, AI_CACHE_TTL)
+    return results
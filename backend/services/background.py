@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+class CoalescingJob:
+    """
+    Runs `job` in the background, one pass at a time. Triggers that arrive
+    while a pass is running are coalesced into a single follow-up pass (e.g.
+    several uploads in a row), so the job always sees the latest data without
+    piling up concurrent runs.
+    """
+    def __init__(self, label: str, job: Callable[[], Awaitable[Any]]):
+        self.label = label
+        self.job = job
+        self._task: Optional[asyncio.Task] = None
+        self._pending_reason: Optional[str] = None
+
+    async def _run(self, reason: str):
+        while reason:
+            try:
+                summary = await self.job()
+                print(f"{self.label} ({reason}): {summary}")
+            except Exception as e:
+                print(f"{self.label} ({reason}) failed: {e}")
+            # A trigger that arrived mid-run gets a fresh pass
+            reason, self._pending_reason = self._pending_reason, None
+
+    def schedule(self, reason: str) -> asyncio.Task:
+        """Starts a background pass, or queues one if a pass is already running."""
+        if self._task is not None and not self._task.done():
+            self._pending_reason = reason
+            return self._task
+        self._task = asyncio.ensure_future(self._run(reason))
+        return self._task
+
+    def stop(self):
+        self._pending_reason = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
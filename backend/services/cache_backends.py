@@ -0,0 +1,755 @@
+import json
+import time
+import uuid
+import asyncio
+import fnmatch
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, List
+
+from ..responses import dumps
+from .cache_codecs import CacheCodec
+
+# Try importing redis
+try:
+    import redis.asyncio as redis
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    REDIS_AVAILABLE = True
+except ImportError:
+    print("Redis package not installed. Using in-memory cache.")
+    REDIS_AVAILABLE = False
+
+# Errors meaning Redis is unreachable: only these count toward opening the circuit
+OUTAGE_ERRORS = (ConnectionError, TimeoutError, OSError) + (
+    (RedisConnectionError, RedisTimeoutError) if REDIS_AVAILABLE else ()
+)
+
+LOCAL_LOCK = "local"
+LOCK_PREFIX = "lock:"
+SCAN_BATCH = 500  # Keys per SCAN page / UNLINK call during pattern clears
+
+# Deletes the lock only if we still own it (it may have expired and been re-acquired)
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+def estimate_size(value: Any) -> int:
+    """Approximate payload size in bytes (length of its JSON encoding)."""
+    try:
+        return len(dumps(value))
+    except (TypeError, ValueError):
+        return 0
+
+class CacheBackend:
+    """
+    Interface every cache tier implements. Values are plain JSON-compatible data.
+    """
+    name = "base"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: int = 60) -> Optional[int]:
+        """
+        Stores `value`; returns its approximate size in bytes (serialized,
+        uncompressed), or None when the value couldn't be stored.
+        """
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def clear(self, key_pattern: str = None, keep_prefix: str = None):
+        """Removes keys matching the glob `key_pattern`, except those starting with `keep_prefix`."""
+        raise NotImplementedError
+
+    async def get_versions(self, *keys: str) -> List[int]:
+        """Current values of namespace version counters (0 when never bumped)."""
+        raise NotImplementedError
+
+    async def bump_version(self, key: str) -> int:
+        """Atomically increments a namespace version counter and returns the new value."""
+        raise NotImplementedError
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        """
+        Cross-process lock used for single-flight recomputation. Returns a token
+        when acquired, None when another process holds it. Backends without
+        shared state have nothing to coordinate, so they always grant it.
+        """
+        return LOCAL_LOCK
+
+    async def release_lock(self, key: str, token: str):
+        pass
+
+    async def ping(self) -> bool:
+        return True
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU + TTL store bounded by entry count and (estimated) bytes.
+    Expired entries are dropped on read and by a periodic background sweep.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024, sweep_interval: float = 30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._store: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._versions: Dict[str, int] = {}
+        self.on_evict: Optional[Callable[[str], None]] = None  # Called with each evicted key
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._store)
+
+    def _remove(self, key: str):
+        _, _, size = self._store.pop(key)
+        self.current_bytes -= size
+
+    def get_nowait(self, key: str) -> Optional[Any]:
+        entry = self._store.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at < time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._store.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set_nowait(self, key: str, value: Any, ttl: int = 60, size: int = None) -> int:
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            return size  # Would evict everything else; not worth caching locally
+        if key in self._store:
+            self._remove(key)
+        self._store[key] = (value, time.time() + ttl, size)
+        self.current_bytes += size
+
+        # Evict least recently used until back within bounds
+        while len(self._store) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._store))
+            self._remove(oldest)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(oldest)
+        return size
+
+    def delete_nowait(self, *keys: str):
+        for key in keys:
+            if key in self._store:
+                self._remove(key)
+
+    def clear_nowait(self, key_pattern: str = None, keep_prefix: str = None):
+        if key_pattern is None and keep_prefix is None:
+            self._store.clear()
+            self.current_bytes = 0
+            return
+        for key in [
+            k for k in self._store
+            if (key_pattern is None or fnmatch.fnmatchcase(k, key_pattern))
+            and not (keep_prefix and k.startswith(keep_prefix))
+        ]:
+            self._remove(key)
+
+    def sweep(self) -> int:
+        """Drops every expired entry. Returns the number removed."""
+        now = time.time()
+        expired = [k for k, (_, expires_at, _) in self._store.items() if expires_at < now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.get_nowait(key)
+
+    async def set(self, key: str, value: Any, ttl: int = 60) -> int:
+        return self.set_nowait(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        self.delete_nowait(*keys)
+
+    async def clear(self, key_pattern: str = None, keep_prefix: str = None):
+        self.clear_nowait(key_pattern, keep_prefix)
+
+    async def get_versions(self, *keys: str) -> List[int]:
+        return [self._versions.get(key, 0) for key in keys]
+
+    async def bump_version(self, key: str) -> int:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "entries": len(self._store),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class RedisBackend(CacheBackend):
+    """
+    Redis tier on an explicit, bounded connection pool.
+    Connection/timeout errors are counted and re-raised so CircuitBreakerBackend
+    can fail over; undecodable entries are treated as misses, and values the
+    codec can't encode are not cached.
+
+    Namespace version counters are memoized locally for `version_ttl` seconds
+    so resolving a key doesn't cost an extra round trip per read; a bump made
+    by another worker is therefore picked up within that window.
+    """
+    name = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        codec: Optional[CacheCodec] = None,
+        max_connections: int = 50,
+        socket_timeout: float = 0.5,
+        version_ttl: float = 1.0,
+    ):
+        self.redis_url = redis_url
+        self.version_ttl = version_ttl
+        self._versions: Dict[str, tuple] = {}  # key -> (version, fetched_at)
+        self.codec = codec or CacheCodec()
+        # Blocking pool: when every connection is busy, callers wait up to
+        # socket_timeout for one instead of opening unbounded extra connections.
+        # Raw bytes: payloads are binary (codec header + msgpack/orjson, maybe compressed)
+        self.pool = redis.BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=max_connections,
+            timeout=socket_timeout,
+            socket_connect_timeout=socket_timeout,
+            socket_timeout=socket_timeout,
+            health_check_interval=30,
+            decode_responses=False,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.unencodable = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            val = await self.client.get(key)
+        except Exception:
+            self.errors += 1
+            raise
+        if val is None:
+            self.misses += 1
+            return None
+        try:
+            value = self.codec.decode(val)
+        except Exception:
+            self.errors += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int = 60) -> Optional[int]:
+        try:
+            data, size = self.codec.encode_sized(value)
+        except (TypeError, ValueError, OverflowError) as e:
+            # A bad value, not a Redis problem: skip caching it
+            self.unencodable += 1
+            print(f"Warning: Cache value for {key} not encodable with {self.codec.serializer}: {e}")
+            return None
+        try:
+            await self.client.set(key, data, ex=ttl)
+        except Exception:
+            self.errors += 1
+            raise
+        return size
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            await self.client.delete(*keys)
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def clear(self, key_pattern: str = None, keep_prefix: str = None) -> int:
+        """
+        Deletes matching keys incrementally: SCAN pages of SCAN_BATCH keys and
+        UNLINK them (memory is reclaimed off Redis' main thread). Unlike
+        FLUSHDB this never blocks the server or touches other apps' keys.
+        Returns the number of keys removed.
+        """
+        keep = keep_prefix.encode("utf-8") if keep_prefix else None
+        removed = 0
+        batch = []
+        try:
+            async for key in self.client.scan_iter(match=key_pattern or "*", count=SCAN_BATCH):
+                if keep is not None and key.startswith(keep):
+                    continue
+                batch.append(key)
+                if len(batch) >= SCAN_BATCH:
+                    removed += await self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                removed += await self.client.unlink(*batch)
+        except Exception:
+            self.errors += 1
+            raise
+        return removed
+
+    def remember_version(self, key: str, version: int):
+        cached = self._versions.get(key)
+        # Counters only grow: never let a late message move us backwards
+        if cached is None or version >= cached[0]:
+            self._versions[key] = (version, time.monotonic())
+
+    async def get_versions(self, *keys: str) -> List[int]:
+        now = time.monotonic()
+        cached = [self._versions.get(key) for key in keys]
+        if all(entry is not None and now - entry[1] < self.version_ttl for entry in cached):
+            return [entry[0] for entry in cached]
+        try:
+            values = await self.client.mget(keys)
+        except Exception:
+            self.errors += 1
+            raise
+        versions = [int(value) if value is not None else 0 for value in values]
+        for key, version in zip(keys, versions):
+            self._versions[key] = (version, now)
+        return versions
+
+    async def bump_version(self, key: str) -> int:
+        try:
+            version = await self.client.incr(key)
+        except Exception:
+            self.errors += 1
+            raise
+        self.remember_version(key, version)
+        return version
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.client.set(LOCK_PREFIX + key, token, nx=True, px=int(timeout * 1000))
+        except Exception:
+            self.errors += 1
+            return LOCAL_LOCK  # Fail open: compute locally rather than wait on a broken Redis
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str):
+        if token == LOCAL_LOCK:
+            return
+        try:
+            await self.client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_PREFIX + key, token)
+        except Exception:
+            self.errors += 1
+
+    async def ping(self) -> bool:
+        try:
+            await self.client.ping()
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        try:
+            await self.client.aclose()
+            await self.pool.disconnect()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "unencodable": self.unencodable,
+            "pool": {
+                "max_connections": self.pool.max_connections,
+                # Private in redis-py and renamed across versions, hence getattr
+                "in_use_connections": len(getattr(self.pool, "_in_use_connections", ())),
+            },
+            "codec": self.codec.stats(),
+        }
+
+class TieredBackend(CacheBackend):
+    """
+    Near cache: a small local MemoryBackend (L1) in front of Redis (L2).
+
+    Every write, delete, clear or version bump is published on a Redis pub/sub
+    channel and each worker applies it to its L1 (and version memo), so
+    repeated reads are served from local memory while staying consistent
+    across uvicorn workers. While the subscription is down (startup, Redis
+    outage) L1 is bypassed, and it is flushed on reconnect since messages may
+    have been missed. `l1_ttl` bounds staleness as a last resort.
+    """
+    name = "tiered"
+    channel = "cache:invalidate"
+
+    def __init__(self, l1: MemoryBackend, l2: RedisBackend, l1_ttl: int = 30, reconnect_delay: float = 1.0):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+        self.reconnect_delay = reconnect_delay
+        self.instance_id = uuid.uuid4().hex
+        self.subscribed = False
+        self.invalidations_received = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Optional[Any]:
+        if self.subscribed:
+            value = self.l1.get_nowait(key)
+            if value is not None:
+                return value
+        value = await self.l2.get(key)
+        if value is not None and self.subscribed:
+            self.l1.set_nowait(key, value, self.l1_ttl)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int = 60) -> Optional[int]:
+        size = await self.l2.set(key, value, ttl)
+        if size is None:
+            return None  # Not stored
+        await self._publish({"keys": [key]})
+        if self.subscribed:
+            self.l1.set_nowait(key, value, min(ttl, self.l1_ttl), size)
+        return size
+
+    async def delete(self, *keys: str):
+        self.l1.delete_nowait(*keys)
+        await self.l2.delete(*keys)
+        await self._publish({"keys": list(keys)})
+
+    async def clear(self, key_pattern: str = None, keep_prefix: str = None):
+        self.l1.clear_nowait(key_pattern, keep_prefix)
+        await self.l2.clear(key_pattern, keep_prefix)
+        await self._publish({"pattern": key_pattern or "*", "keep_prefix": keep_prefix})
+
+    async def get_versions(self, *keys: str) -> List[int]:
+        return await self.l2.get_versions(*keys)
+
+    async def bump_version(self, key: str) -> int:
+        version = await self.l2.bump_version(key)
+        await self._publish({"version": [key, version]})
+        return version
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        return await self.l2.acquire_lock(key, timeout)
+
+    async def release_lock(self, key: str, token: str):
+        await self.l2.release_lock(key, token)
+
+    async def ping(self) -> bool:
+        return await self.l2.ping()
+
+    async def _publish(self, message: Dict[str, Any]):
+        message["origin"] = self.instance_id
+        try:
+            await self.l2.client.publish(self.channel, json.dumps(message))
+        except Exception:
+            self.l2.errors += 1
+
+    def handle_invalidation(self, raw: Any):
+        """Applies one invalidation message from another worker to the local L1."""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        self.invalidations_received += 1
+        if "version" in message:
+            key, version = message["version"]
+            self.l2.remember_version(key, version)
+        elif "pattern" in message:
+            pattern = message["pattern"]
+            self.l1.clear_nowait(None if pattern == "*" else pattern, message.get("keep_prefix"))
+        else:
+            self.l1.delete_nowait(*message.get("keys", []))
+
+    async def _listen(self):
+        while True:
+            pubsub = self.l2.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Anything cached before (re)subscribing may have missed invalidations
+                self.l1.clear_nowait()
+                self.subscribed = True
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.handle_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def start(self):
+        await self.l1.start()
+        await self.l2.start()
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self.subscribed = False
+        await self.l1.close()
+        await self.l2.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "subscribed": self.subscribed,
+            "invalidations_received": self.invalidations_received,
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats(),
+        }
+
+class CircuitBreakerBackend(CacheBackend):
+    """
+    Wraps a Redis-based backend so an outage costs at most a few timeouts.
+
+    After `failure_threshold` consecutive errors the circuit opens and every
+    call goes straight to the in-process `fallback` tier. A background probe
+    pings the primary every `probe_interval` seconds and closes the circuit
+    once it answers, first replaying deletes, clears and version bumps issued
+    while open so Redis doesn't serve entries invalidated during the outage.
+    If too many pile up, recovery clears `overflow_pattern` instead. That
+    pattern (this app's namespace, e.g. "dip:*") also stands in for clear()
+    without a pattern, so no clear ever scans the whole Redis database.
+    """
+    name = "circuit_breaker"
+    MAX_MISSED_INVALIDATIONS = 1000
+
+    def __init__(
+        self,
+        primary: CacheBackend,
+        fallback: MemoryBackend,
+        failure_threshold: int = 3,
+        probe_interval: float = 5.0,
+        *,
+        overflow_pattern: str,
+    ):
+        self.primary = primary
+        self.fallback = fallback
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.overflow_pattern = overflow_pattern
+        self.is_open = False
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.recoveries = 0
+        self.last_error: Optional[str] = None
+        self.state_changed_at = time.time()
+        self._missed_keys: set = set()
+        self._missed_patterns: set = set()  # (pattern, keep_prefix)
+        self._missed_versions: set = set()
+        self._prober: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        return self.fallback.name if self.is_open else self.primary.name
+
+    def _record_failure(self, error: Exception):
+        self.last_error = f"{type(error).__name__}: {error}"
+        if not isinstance(error, OUTAGE_ERRORS):
+            return  # Served by the fallback this once; Redis itself is fine
+        self.consecutive_failures += 1
+        if not self.is_open and self.consecutive_failures >= self.failure_threshold:
+            self.is_open = True
+            self.trips += 1
+            self.state_changed_at = time.time()
+            print(f"Cache circuit opened after {self.consecutive_failures} failures ({self.last_error}). Using memory.")
+
+    @property
+    def pending_invalidations(self) -> int:
+        return len(self._missed_keys) + len(self._missed_patterns) + len(self._missed_versions)
+
+    def _record_missed(self, keys=(), pattern: tuple = None):
+        if pattern is not None:
+            self._missed_patterns.add(pattern)
+        self._missed_keys.update(keys)
+        if len(self._missed_keys) + len(self._missed_patterns) > self.MAX_MISSED_INVALIDATIONS:
+            self._missed_keys.clear()
+            self._missed_patterns = {(self.overflow_pattern, None)}
+
+    async def _call(self, op: str, *args):
+        if not self.is_open:
+            try:
+                result = await getattr(self.primary, op)(*args)
+                self.consecutive_failures = 0
+                return result
+            except Exception as e:
+                self._record_failure(e)
+        return await getattr(self.fallback, op)(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: Any, ttl: int = 60) -> Optional[int]:
+        return await self._call("set", key, value, ttl)
+
+    async def _invalidate(self, op: str, *args, keys=(), pattern: tuple = None):
+        # Invalidations that don't reach Redis are remembered and replayed on recovery
+        if not self.is_open:
+            try:
+                await getattr(self.primary, op)(*args)
+                self.consecutive_failures = 0
+                return
+            except Exception as e:
+                self._record_failure(e)
+        self._record_missed(keys=keys, pattern=pattern)
+
+    async def delete(self, *keys: str):
+        await self._invalidate("delete", *keys, keys=keys)
+        self.fallback.delete_nowait(*keys)
+
+    async def clear(self, key_pattern: str = None, keep_prefix: str = None):
+        key_pattern = key_pattern or self.overflow_pattern
+        await self._invalidate("clear", key_pattern, keep_prefix, pattern=(key_pattern, keep_prefix))
+        self.fallback.clear_nowait(key_pattern, keep_prefix)
+
+    async def get_versions(self, *keys: str) -> List[int]:
+        return await self._call("get_versions", *keys)
+
+    async def bump_version(self, key: str) -> int:
+        if not self.is_open:
+            try:
+                version = await self.primary.bump_version(key)
+                self.consecutive_failures = 0
+                return version
+            except Exception as e:
+                self._record_failure(e)
+        self._missed_versions.add(key)
+        return await self.fallback.bump_version(key)
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        if self.is_open:
+            return LOCAL_LOCK
+        return await self.primary.acquire_lock(key, timeout)
+
+    async def release_lock(self, key: str, token: str):
+        if token != LOCAL_LOCK:
+            await self.primary.release_lock(key, token)
+
+    async def probe(self) -> bool:
+        """One health check; closes the circuit when the primary is reachable again."""
+        healthy = await self.primary.ping()
+        if healthy and (self.is_open or self.pending_invalidations):
+            try:
+                for key in sorted(self._missed_versions):
+                    await self.primary.bump_version(key)
+                for pattern, keep_prefix in sorted(self._missed_patterns, key=repr):
+                    await self.primary.clear(pattern, keep_prefix)
+                if self._missed_keys:
+                    await self.primary.delete(*self._missed_keys)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+            self._missed_keys.clear()
+            self._missed_patterns.clear()
+            self._missed_versions.clear()
+            if self.is_open:
+                self.fallback.clear_nowait()
+                self.is_open = False
+                self.consecutive_failures = 0
+                self.recoveries += 1
+                self.state_changed_at = time.time()
+                print("Cache circuit closed. Redis reachable again.")
+        elif not healthy and not self.is_open:
+            self._record_failure(ConnectionError("ping failed"))
+        return healthy
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            if self.is_open or self.pending_invalidations:
+                await self.probe()
+
+    async def start(self):
+        await self.fallback.start()
+        await self.primary.start()
+        # Fail fast at boot: if Redis is down, open immediately rather than
+        # paying failure_threshold timeouts on the first requests
+        if not await self.primary.ping():
+            self.consecutive_failures = self.failure_threshold - 1
+            self._record_failure(ConnectionError("Redis unreachable at startup"))
+        if self._prober is None:
+            self._prober = asyncio.get_running_loop().create_task(self._probe_loop())
+
+    async def close(self):
+        if self._prober is not None:
+            self._prober.cancel()
+            self._prober = None
+        await self.fallback.close()
+        await self.primary.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.primary.name,
+            "mode": self.mode,
+            "circuit": {
+                "state": "open" if self.is_open else "closed",
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "trips": self.trips,
+                "recoveries": self.recoveries,
+                "last_error": self.last_error,
+                "seconds_in_state": round(time.time() - self.state_changed_at, 1),
+                "pending_invalidations": self.pending_invalidations,
+            },
+            "primary": self.primary.stats(),
+            "fallback": self.fallback.stats(),
+        }
@@ -0,0 +1,141 @@
+import json
+import zlib
+from typing import Any, Dict, Callable, Tuple
+
+# Optional serializers / compressors. Each one is only selectable when installed.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+# Every encoded entry starts with a 2-byte header: serializer id, compressor id.
+# Ids are below 0x20 so a header never looks like the start of a JSON document,
+# which lets entries written before codecs existed (plain JSON text) still decode.
+SERIALIZER_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSOR_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+def _serializers() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    table = {
+        "json": (
+            lambda v: json.dumps(v, separators=(",", ":")).encode("utf-8"),
+            lambda b: json.loads(b),
+        ),
+    }
+    if ORJSON_AVAILABLE:
+        table["orjson"] = (lambda v: orjson.dumps(v, option=orjson.OPT_NON_STR_KEYS), orjson.loads)
+    if MSGPACK_AVAILABLE:
+        table["msgpack"] = (
+            lambda v: msgpack.packb(v, use_bin_type=True),
+            lambda b: msgpack.unpackb(b, raw=False, strict_map_key=False),
+        )
+    return table
+
+def _compressors() -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    table = {
+        "none": (lambda b: b, lambda b: b),
+        "zlib": (lambda b: zlib.compress(b, 1), zlib.decompress),
+    }
+    if ZSTD_AVAILABLE:
+        table["zstd"] = (
+            zstandard.ZstdCompressor(level=3).compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    if LZ4_AVAILABLE:
+        table["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+    return table
+
+SERIALIZERS = _serializers()
+COMPRESSORS = _compressors()
+_SERIALIZERS_BY_ID = {SERIALIZER_IDS[name]: fns for name, fns in SERIALIZERS.items()}
+_COMPRESSORS_BY_ID = {COMPRESSOR_IDS[name]: fns for name, fns in COMPRESSORS.items()}
+
+def default_serializer() -> str:
+    return "orjson" if ORJSON_AVAILABLE else "json"
+
+def default_compressor() -> str:
+    # zstd decodes about as fast as lz4 at roughly half the size (scripts/bench_serialization.py)
+    for name in ("zstd", "lz4", "zlib"):
+        if name in COMPRESSORS:
+            return name
+    return "none"
+
+class CacheCodec:
+    """
+    Encodes cached values to bytes for Redis.
+    Payloads of at least `compress_min_bytes` are compressed (kept only if
+    smaller). The serializer/compressor used is recorded per entry, so the
+    codec can be changed without flushing existing entries.
+    """
+    def __init__(self, serializer: str = None, compressor: str = None, compress_min_bytes: int = 1024):
+        serializer = serializer or default_serializer()
+        compressor = compressor or default_compressor()
+        if serializer not in SERIALIZERS:
+            print(f"Warning: Cache serializer '{serializer}' unavailable. Using {default_serializer()}.")
+            serializer = default_serializer()
+        if compressor not in COMPRESSORS:
+            print(f"Warning: Cache compressor '{compressor}' unavailable. Using {default_compressor()}.")
+            compressor = default_compressor()
+        self.serializer = serializer
+        self.compressor = compressor
+        self.compress_min_bytes = compress_min_bytes
+        self.bytes_raw = 0  # serialized size before compression
+        self.bytes_encoded = 0  # size actually written
+
+    def encode(self, value: Any) -> bytes:
+        return self.encode_sized(value)[0]
+
+    def encode_sized(self, value: Any) -> Tuple[bytes, int]:
+        """Encoded entry and the serialized size before compression."""
+        dumps, _ = SERIALIZERS[self.serializer]
+        payload = dumps(value)
+        raw_size = len(payload)
+        self.bytes_raw += raw_size
+        compressor_id = COMPRESSOR_IDS["none"]
+        if self.compressor != "none" and len(payload) >= self.compress_min_bytes:
+            compress, _ = COMPRESSORS[self.compressor]
+            compressed = compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                compressor_id = COMPRESSOR_IDS[self.compressor]
+        data = bytes((SERIALIZER_IDS[self.serializer], compressor_id)) + payload
+        self.bytes_encoded += len(data)
+        return data, raw_size
+
+    def decode(self, data: Any) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] >= 0x20:
+            return json.loads(data)  # Legacy entry: plain JSON text
+        serializer = _SERIALIZERS_BY_ID.get(data[0])
+        compressor = _COMPRESSORS_BY_ID.get(data[1])
+        if serializer is None or compressor is None:
+            raise ValueError(f"Cache entry uses an unavailable codec ({data[0]}, {data[1]})")
+        return serializer[1](compressor[1](data[2:]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "serializer": self.serializer,
+            "compressor": self.compressor,
+            "compress_min_bytes": self.compress_min_bytes,
+            "bytes_raw": self.bytes_raw,
+            "bytes_encoded": self.bytes_encoded,
+        }
@@ -0,0 +1,143 @@
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List
+
+# Upper bounds (bytes) of the payload size histogram buckets; the last bucket is +Inf
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+RESULTS = ("hit", "stale", "miss", "coalesced")
+
+class PrefixStats:
+    """Counters for the keys under one @cache key_prefix."""
+
+    def __init__(self):
+        self.requests = {result: 0 for result in RESULTS}
+        self.early_refreshes = 0
+        self.evictions = 0
+        self.computes = 0
+        self.compute_seconds = 0.0
+        self.seconds_saved = 0.0
+        self.size_buckets = [0] * (len(SIZE_BUCKETS) + 1)
+        self.size_sum = 0
+
+    @property
+    def avg_compute_seconds(self) -> float:
+        return self.compute_seconds / self.computes if self.computes else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        served = self.requests["hit"] + self.requests["stale"] + self.requests["coalesced"]
+        total = served + self.requests["miss"]
+        return {
+            **self.requests,
+            "hit_ratio": round(served / total, 4) if total else None,
+            "early_refreshes": self.early_refreshes,
+            "evictions": self.evictions,
+            "computes": self.computes,
+            "avg_compute_ms": round(self.avg_compute_seconds * 1000, 2),
+            "compute_seconds_saved": round(self.seconds_saved, 3),
+            "payload_bytes": {
+                "count": sum(self.size_buckets),
+                "sum": self.size_sum,
+                "buckets": {
+                    str(bound): count for bound, count in zip(SIZE_BUCKETS + ("+Inf",), self.size_buckets)
+                },
+            },
+        }
+
+class CacheMetrics:
+    """
+    Per-prefix cache statistics for tuning TTLs per endpoint.
+
+    Compute time saved is estimated as the prefix's average compute time for
+    every request answered without computing (hit, stale or coalesced).
+    Counters are per worker process.
+    """
+
+    def __init__(self):
+        self.prefixes: Dict[str, PrefixStats] = {}
+        self.started_at = time.time()
+
+    def _get(self, prefix: str) -> PrefixStats:
+        stats = self.prefixes.get(prefix)
+        if stats is None:
+            stats = self.prefixes[prefix] = PrefixStats()
+        return stats
+
+    def record_request(self, prefix: str, result: str):
+        stats = self._get(prefix)
+        stats.requests[result] += 1
+        if result != "miss":
+            stats.seconds_saved += stats.avg_compute_seconds
+
+    def record_early_refresh(self, prefix: str):
+        self._get(prefix).early_refreshes += 1
+
+    def record_eviction(self, prefix: str):
+        self._get(prefix).evictions += 1
+
+    def record_compute(self, prefix: str, seconds: float, size: int):
+        stats = self._get(prefix)
+        stats.computes += 1
+        stats.compute_seconds += seconds
+        stats.size_buckets[bisect_left(SIZE_BUCKETS, size)] += 1
+        stats.size_sum += size
+
+    def reset(self):
+        self.prefixes.clear()
+        self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "since": self.started_at,
+            "prefixes": {prefix: stats.snapshot() for prefix, stats in sorted(self.prefixes.items())},
+        }
+
+    def prometheus(self) -> str:
+        """Renders the counters in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        items = sorted(self.prefixes.items())
+        metric(
+            "cache_requests_total", "counter", "Cache lookups by key prefix and result.",
+            [({"prefix": p, "result": r}, s.requests[r]) for p, s in items for r in RESULTS],
+        )
+        metric(
+            "cache_early_refreshes_total", "counter", "Probabilistic refreshes started before soft expiry.",
+            [({"prefix": p}, s.early_refreshes) for p, s in items],
+        )
+        metric(
+            "cache_evictions_total", "counter", "Entries evicted from in-process tiers to stay within bounds.",
+            [({"prefix": p}, s.evictions) for p, s in items],
+        )
+        metric(
+            "cache_computes_total", "counter", "Values computed and stored.",
+            [({"prefix": p}, s.computes) for p, s in items],
+        )
+        metric(
+            "cache_compute_seconds_total", "counter", "Time spent computing values.",
+            [({"prefix": p}, round(s.compute_seconds, 6)) for p, s in items],
+        )
+        metric(
+            "cache_compute_seconds_saved_total", "counter", "Estimated compute time avoided by cached answers.",
+            [({"prefix": p}, round(s.seconds_saved, 6)) for p, s in items],
+        )
+
+        lines.append("# HELP cache_payload_bytes Size of computed values stored in the cache.")
+        lines.append("# TYPE cache_payload_bytes histogram")
+        for p, s in items:
+            cumulative = 0
+            for bound, count in zip(SIZE_BUCKETS + ("+Inf",), s.size_buckets):
+                cumulative += count
+                lines.append(f'cache_payload_bytes_bucket{{prefix="{_escape(p)}",le="{bound}"}} {cumulative}')
+            lines.append(f'cache_payload_bytes_sum{{prefix="{_escape(p)}"}} {s.size_sum}')
+            lines.append(f'cache_payload_bytes_count{{prefix="{_escape(p)}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
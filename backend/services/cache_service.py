@@ -1,140 +1,528 @@
 import os
 import json
+import enum
+import hashlib
+import math
+import random
 import asyncio
+import contextvars
 import time
+from collections import Counter
 from functools import wraps
-from typing import Optional, Any, Callable
+from datetime import date, datetime
+from typing import Optional, Any, Awaitable, Callable, Dict, Iterable, List, Tuple
 import traceback
 
-# Try importing redis
-try:
-    import redis.asyncio as redis
-    from redis.exceptions import ConnectionError, TimeoutError
-    REDIS_AVAILABLE = True
-except ImportError:
-    msg = "Redis package not installed. Using in-memory cache."
-    print(msg)
-    REDIS_AVAILABLE = False
+from .cache_backends import (
+    REDIS_AVAILABLE, CacheBackend, MemoryBackend, RedisBackend, TieredBackend, CircuitBreakerBackend,
+)
+from .cache_codecs import CacheCodec
+from .cache_metrics import CacheMetrics
+
+CACHE_BACKENDS = ("memory", "redis", "tiered")
+
+# Marks values written by get_or_compute: {ENVELOPE_MARK: 1, "value", "fresh_until", "delta"}
+ENVELOPE_MARK = "__cache_envelope__"
+XFETCH_BETA = 1.0
+
+# Version scope bumped by clear() with no pattern; invalidates every namespace
+ALL_NAMESPACES = "_all"
+GLOB_CHARS = "*?["
+
+# Request popularity tracking for the cache warmer (see record_request)
+MAX_TRACKED_REQUESTS = 1000
+HOT_REQUESTS_TTL = 7 * 24 * 3600
+WARMABLE_TYPES = (type(None), bool, int, float, str)
+# Set while the cache warmer replays requests, so those aren't counted as traffic
+warming = contextvars.ContextVar("cache_warming", default=False)
+
+def _is_envelope(entry: Any) -> bool:
+    return isinstance(entry, dict) and entry.get(ENVELOPE_MARK) == 1
+
+def _log_refresh_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Cache background refresh failed: {task.exception()}")
+
+def _log_cleanup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Cache cleanup failed: {task.exception()}")
 
 class CacheService:
-    def __init__(self):
-        self.redis_client = None
-        self.memory_cache = {} # { key: { 'value': val, 'expires': timestamp } }
-        self.use_redis = False
+    """
+    Facade over the configured cache backend.
+
+    CACHE_BACKEND selects the tier: "memory" (bounded in-process LRU), "redis",
+    or "tiered" (local L1 in front of Redis, kept coherent across workers via
+    pub/sub invalidation). Defaults to redis when the package is installed,
+    memory otherwise. Memory bounds come from CACHE_MAX_ENTRIES /
+    CACHE_MAX_BYTES, the L1 lifetime in tiered mode from CACHE_L1_TTL.
+    Redis payloads are encoded with CACHE_CODEC (json/orjson/msgpack) and
+    compressed with CACHE_COMPRESSION (none/zlib/zstd/lz4) from
+    CACHE_COMPRESS_MIN_BYTES up; both default to the best one installed.
+    Redis modes run on a bounded pool (CACHE_REDIS_MAX_CONNECTIONS,
+    CACHE_REDIS_TIMEOUT) behind a circuit breaker that falls back to memory
+    after CACHE_BREAKER_THRESHOLD consecutive failures.
+
+    Keys are stored as `{CACHE_NAMESPACE}:{epoch}.{version}:{key}`, where
+    `version` belongs to the key's prefix (e.g. "rev_trend"). See clear().
+    """
+    def __init__(self, backend: Optional[CacheBackend] = None):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self.namespace = os.getenv("CACHE_NAMESPACE", "dip")
+        self.backend = backend if backend is not None else self._build_backend(os.getenv("CACHE_BACKEND"))
+        self.use_redis = isinstance(self.backend, (RedisBackend, TieredBackend, CircuitBreakerBackend))
+        self.lock_timeout = float(os.getenv("CACHE_LOCK_TIMEOUT", 10))
+        self.lock_poll_interval = 0.05
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._cleanups: set = set()
+        self._request_counts: Counter = Counter()  # (target, params json) -> calls since last flush
+        self.coalesced = 0  # Requests that waited on another caller's computation
+        self.stale_served = 0  # Reads answered from a soft-expired entry
+        self.early_refreshes = 0  # XFetch refreshes triggered before soft expiry
+        self.background_refreshes = 0
+        self.metrics = CacheMetrics()
+        for tier in self._memory_tiers():
+            tier.on_evict = self._record_eviction
+
+    def _build_memory_backend(self, max_entries: int = None, max_bytes: int = None) -> MemoryBackend:
+        return MemoryBackend(
+            max_entries=max_entries or int(os.getenv("CACHE_MAX_ENTRIES", 10_000)),
+            max_bytes=max_bytes or int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        )
+
+    def _build_backend(self, mode: Optional[str]) -> CacheBackend:
+        mode = (mode or ("redis" if REDIS_AVAILABLE else "memory")).lower()
+        if mode not in CACHE_BACKENDS:
+            print(f"Warning: Unknown CACHE_BACKEND '{mode}'. Defaulting to memory.")
+            mode = "memory"
 
-        if REDIS_AVAILABLE:
-            # Attempt lazy connection
+        if mode != "memory":
+            if not REDIS_AVAILABLE:
+                print(f"Warning: CACHE_BACKEND={mode} needs the redis package. Defaulting to memory.")
+                return self._build_memory_backend()
+            codec = CacheCodec(
+                serializer=os.getenv("CACHE_CODEC"),
+                compressor=os.getenv("CACHE_COMPRESSION"),
+                compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 1024)),
+            )
             try:
-                self.redis_client = redis.from_url(
-                    self.redis_url, 
-                    decode_responses=True, 
-                    socket_connect_timeout=2
+                redis_backend = RedisBackend(
+                    self.redis_url,
+                    codec,
+                    max_connections=int(os.getenv("CACHE_REDIS_MAX_CONNECTIONS", 50)),
+                    socket_timeout=float(os.getenv("CACHE_REDIS_TIMEOUT", 0.5)),
+                    version_ttl=float(os.getenv("CACHE_VERSION_TTL", 1.0)),
                 )
-                self.use_redis = True
             except Exception as e:
                 print(f"Warning: Redis init failed ({e}). Defaulting to memory.")
-                self.use_redis = False
+                return self._build_memory_backend()
+            primary = redis_backend
+            if mode == "tiered":
+                # L1 stays small: it only needs to hold the hot dashboard keys
+                l1 = self._build_memory_backend(
+                    max_entries=int(os.getenv("CACHE_L1_MAX_ENTRIES", 1_000)),
+                    max_bytes=int(os.getenv("CACHE_L1_MAX_BYTES", 16 * 1024 * 1024)),
+                )
+                primary = TieredBackend(l1, redis_backend, l1_ttl=int(os.getenv("CACHE_L1_TTL", 30)))
+            # A Redis outage degrades to the memory tier instead of adding a timeout to every request
+            return CircuitBreakerBackend(
+                primary,
+                fallback=self._build_memory_backend(),
+                failure_threshold=int(os.getenv("CACHE_BREAKER_THRESHOLD", 3)),
+                probe_interval=float(os.getenv("CACHE_BREAKER_PROBE_INTERVAL", 5)),
+                overflow_pattern=f"{self.namespace}:*",
+            )
+
+        return self._build_memory_backend()
+
+    def _memory_tiers(self) -> List[MemoryBackend]:
+        backend = self.backend
+        tiers = []
+        if isinstance(backend, CircuitBreakerBackend):
+            tiers.append(backend.fallback)
+            backend = backend.primary
+        if isinstance(backend, TieredBackend):
+            tiers.append(backend.l1)
+        elif isinstance(backend, MemoryBackend):
+            tiers.append(backend)
+        return tiers
+
+    def _record_eviction(self, storage_key: str):
+        # "{namespace}:{epoch}.{version}:{prefix}:..." -> prefix
+        parts = storage_key.split(":", 3)
+        if len(parts) == 4 and parts[0] == self.namespace:
+            self.metrics.record_eviction(parts[2])
 
-    async def _check_redis_connection(self):
-        """Simple ping to verify redis is actually alive"""
-        if not self.use_redis or not self.redis_client:
-            return False
+    async def start(self):
+        """Starts background tasks (expiry sweeping). Called from the app lifespan."""
+        await self.backend.start()
+
+    async def close(self):
+        for task in list(self._cleanups):
+            task.cancel()
         try:
-            await self.redis_client.ping()
-            return True
-        except Exception:
-            # If ping fails, disable redis temporarily or permanently for this instance
-            # For simplicity, we fallback to memory for this request
-            return False
+            await self.flush_request_stats()
+        except Exception as e:
+            print(f"Warning: Could not persist cache request stats: {e}")
+        await self.backend.close()
+
+    def _version_key(self, scope: str) -> str:
+        # Deliberately outside the "{namespace}:" keyspace so cleanups never match it
+        return f"{self.namespace}.version:{scope}"
+
+    async def _storage_key(self, key: str) -> str:
+        """Maps a logical key to the key stored under the current versions."""
+        scope = key.split(":", 1)[0]
+        epoch, version = await self.backend.get_versions(
+            self._version_key(ALL_NAMESPACES), self._version_key(scope)
+        )
+        return f"{self.namespace}:{epoch}.{version}:{key}"
 
     async def get(self, key: str) -> Optional[Any]:
-        # 1. Try Redis
-        if self.use_redis:
-            try:
-                val = await self.redis_client.get(key)
-                if val:
-                    return json.loads(val)
-            except Exception as e:
-                # Log only once or sparsely in real app
-                # print(f"Cache get error (Redis): {e}") 
-                pass # Fall through to memory? No, Redis failure usually means cache miss or seamless fallback
-                
-        # 2. Try Memory (Fallback or Primary)
-        # Note: If use_redis is True but failed, we might want to check memory
-        # But usually we don't sync them. `memory_cache` is primarily for when Redis is OFF.
-        
-        if not self.use_redis:
-            entry = self.memory_cache.get(key)
-            if not entry:
-                return None
-            if entry['expires'] < time.time():
-                del self.memory_cache[key]
-                return None
-            return entry['value']
-            
-        return None
+        return await self.backend.get(await self._storage_key(key))
+
+    async def get_value(self, key: str) -> Optional[Any]:
+        """Like get(), but unwraps entries written by get_or_compute (fresh or stale)."""
+        entry = await self.get(key)
+        return entry["value"] if _is_envelope(entry) else entry
 
     async def set(self, key: str, value: Any, ttl: int = 60):
-        json_val = json.dumps(value)
-        
-        # 1. Try Redis
-        if self.use_redis:
-            try:
-                await self.redis_client.set(key, json_val, ex=ttl)
-                return
-            except Exception as e:
-                print(f"Cache set error (Redis): {e}")
-                # Fallback to memory so we at least cache locally
-        
-        # 2. Memory
-        self.memory_cache[key] = {
-            'value': value, # Store native object in memory
-            'expires': time.time() + ttl
-        }
+        await self.backend.set(await self._storage_key(key), value, ttl)
+
+    async def delete(self, *keys: str):
+        await self.backend.delete(*[await self._storage_key(key) for key in keys])
+
+    # Persistent entries live outside the versioned keyspace: clear() never
+    # touches them. For data that doesn't depend on database contents.
+    async def get_persistent(self, key: str) -> Optional[Any]:
+        return await self.backend.get(f"{self.namespace}.{key}")
+
+    async def get_persistent_value(self, key: str) -> Optional[Any]:
+        """Like get_persistent(), but unwraps entries written by get_or_compute(persistent=True)."""
+        entry = await self.get_persistent(key)
+        return entry["value"] if _is_envelope(entry) else entry
+
+    async def set_persistent(self, key: str, value: Any, ttl: int):
+        await self.backend.set(f"{self.namespace}.{key}", value, ttl)
 
     async def clear(self, key_pattern: str = None):
-        if self.use_redis:
-            try:
-                # simplified clear
-                await self.redis_client.flushdb()
-            except:
-                pass
-        self.memory_cache = {}
+        """
+        Invalidates cached entries.
+
+        None or "*" bumps the global epoch and "prefix:*" bumps that prefix's
+        version: one INCR, after which old entries are unreachable. They are
+        then removed by a background SCAN/UNLINK pass (they'd also expire on
+        their own). Any other pattern is deleted physically, and only within
+        this app's namespace.
+        """
+        if not key_pattern or key_pattern == "*":
+            epoch = await self.backend.bump_version(self._version_key(ALL_NAMESPACES))
+            self._schedule_cleanup(f"{self.namespace}:*", keep_prefix=f"{self.namespace}:{epoch}.")
+            return
+
+        scope, _, rest = key_pattern.partition(":")
+        epoch, _ = await self.backend.get_versions(self._version_key(ALL_NAMESPACES), self._version_key(scope))
+        if rest == "*" and not any(c in scope for c in GLOB_CHARS):
+            version = await self.backend.bump_version(self._version_key(scope))
+            self._schedule_cleanup(
+                f"{self.namespace}:{epoch}.*:{scope}:*", keep_prefix=f"{self.namespace}:{epoch}.{version}:"
+            )
+        else:
+            await self.backend.clear(f"{self.namespace}:{epoch}.*:{key_pattern}")
+
+    def _schedule_cleanup(self, pattern: str, keep_prefix: str):
+        task = asyncio.ensure_future(self.backend.clear(pattern, keep_prefix))
+        self._cleanups.add(task)
+        task.add_done_callback(self._cleanups.discard)
+        task.add_done_callback(_log_cleanup_failure)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int = 60,
+        distributed: bool = False,
+        stale_ttl: int = 0,
+        beta: float = XFETCH_BETA,
+        refresh: Optional[Callable[[], Awaitable[Any]]] = None,
+        lock_timeout: Optional[float] = None,
+        persistent: bool = False,
+    ) -> Any:
+        """
+        Returns the cached value for `key`, computing and storing it on a miss.
+
+        Entries are stored as envelopes with a soft expiry (`ttl`) and a hard
+        expiry (`ttl + stale_ttl`). Between the two, readers get the stale value
+        immediately while `refresh` (defaults to `compute`) runs in the
+        background. Before the soft expiry, XFetch probabilistic early refresh
+        (Vattani et al.) triggers the same background refresh with a chance that
+        grows as expiry nears, scaled by how long the value took to compute and
+        `beta` (0 disables it), so hot keys rarely expire at all.
+
+        Single-flight: concurrent misses for the same key in this process share
+        one computation. With `distributed=True` a Redis lock extends this across
+        workers; callers that lose the lock poll the cache until the winner has
+        stored the value (or the lock times out, then compute themselves).
+        `lock_timeout` (default CACHE_LOCK_TIMEOUT) must cover the slowest compute,
+        or waiters give up and every worker computes anyway.
+
+        `persistent=True` stores the entry outside the versioned keyspace (see
+        get_persistent), for values keyed by their own inputs that clear() must
+        not drop.
+        """
+        lock_timeout = lock_timeout or self.lock_timeout
+        prefix = key.split(":", 1)[0]
+        entry = await self.backend.get(await self._resolve_key(key, persistent))
+        if _is_envelope(entry):
+            now = time.time()
+            fresh_until = entry["fresh_until"]
+            if now >= fresh_until:
+                self.stale_served += 1
+                self.metrics.record_request(prefix, "stale")
+                self._refresh_in_background(key, refresh or compute, ttl, stale_ttl, distributed, lock_timeout, persistent)
+                return entry["value"]
+            self.metrics.record_request(prefix, "hit")
+            if beta > 0 and now - entry["delta"] * beta * math.log(1.0 - random.random()) >= fresh_until:
+                self.early_refreshes += 1
+                self.metrics.record_early_refresh(prefix)
+                self._refresh_in_background(key, refresh or compute, ttl, stale_ttl, distributed, lock_timeout, persistent)
+            return entry["value"]
+        if entry is not None:
+            self.metrics.record_request(prefix, "hit")
+            return entry  # Plain value written through set()
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self.metrics.record_request(prefix, "coalesced")
+        else:
+            self.metrics.record_request(prefix, "miss")
+            # Run as a task so a cancelled caller (client disconnect) doesn't
+            # cancel the computation the other waiters depend on
+            task = self._start_fill(key, compute, ttl, stale_ttl, distributed, lock_timeout, persistent, wait=True)
+        return await asyncio.shield(task)
+
+    async def _resolve_key(self, key: str, persistent: bool) -> str:
+        return f"{self.namespace}.{key}" if persistent else await self._storage_key(key)
+
+    def _start_fill(
+        self, key: str, compute, ttl: int, stale_ttl: int, distributed: bool, lock_timeout: float,
+        persistent: bool, wait: bool,
+    ) -> asyncio.Task:
+        task = asyncio.ensure_future(self._fill(key, compute, ttl, stale_ttl, distributed, lock_timeout, persistent, wait))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _refresh_in_background(
+        self, key: str, compute, ttl: int, stale_ttl: int, distributed: bool, lock_timeout: float, persistent: bool
+    ):
+        if key in self._inflight:
+            return  # Already being recomputed
+        self.background_refreshes += 1
+        task = self._start_fill(key, compute, ttl, stale_ttl, distributed, lock_timeout, persistent, wait=False)
+        task.add_done_callback(_log_refresh_failure)
+
+    async def _fill(
+        self, key: str, compute, ttl: int, stale_ttl: int, distributed: bool, lock_timeout: float,
+        persistent: bool, wait: bool,
+    ) -> Any:
+        # Resolved before computing: if the namespace is cleared meanwhile, the
+        # result lands under the old version instead of passing for fresh data
+        storage_key = await self._resolve_key(key, persistent)
+        lock_key = f"{self.namespace}:{key}"
+        token = None
+        if distributed:
+            token = await self.backend.acquire_lock(lock_key, lock_timeout)
+            if token is None:
+                if not wait:
+                    return None  # Another worker is already refreshing this key
+                value = await self._wait_for_value(storage_key, lock_timeout)
+                if value is not None:
+                    self.coalesced += 1
+                    return value
+        try:
+            started = time.monotonic()
+            result = await compute()
+            delta = time.monotonic() - started
+            if result is not None:
+                envelope = {
+                    ENVELOPE_MARK: 1,
+                    "value": result,
+                    "fresh_until": time.time() + ttl,
+                    "delta": delta,
+                }
+                # Size as measured by the backend while storing: no extra serialization pass
+                size = await self.backend.set(storage_key, envelope, ttl + stale_ttl)
+                self.metrics.record_compute(key.split(":", 1)[0], delta, size or 0)
+            return result
+        finally:
+            if token is not None:
+                await self.backend.release_lock(lock_key, token)
+
+    async def _wait_for_value(self, storage_key: str, lock_timeout: float) -> Optional[Any]:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            value = await self.backend.get(storage_key)
+            if value is not None:
+                return value["value"] if _is_envelope(value) else value
+        return None
+
+    def record_request(self, target: str, params: Dict[str, Any]):
+        """Counts one call of a @cache endpoint so the warmer knows what is popular."""
+        if not all(isinstance(v, WARMABLE_TYPES) for v in params.values()):
+            return  # Can't be replayed from JSON
+        self._request_counts[(target, json.dumps(params, sort_keys=True))] += 1
+        if len(self._request_counts) > MAX_TRACKED_REQUESTS:
+            self._request_counts = Counter(dict(self._request_counts.most_common(MAX_TRACKED_REQUESTS // 2)))
+
+    async def flush_request_stats(self) -> Counter:
+        """
+        Merges this worker's request counts into the shared, persisted ones and
+        returns the result. Stored counts are halved on every flush so the
+        ranking follows recent traffic. Persistent, so clear() doesn't reset it.
+        """
+        counts = Counter()
+        for target, params, count in await self.get_persistent("warm:requests") or []:
+            counts[(target, params)] += count / 2
+        counts.update(self._request_counts)
+        self._request_counts = Counter()
+        top = counts.most_common(MAX_TRACKED_REQUESTS)
+        await self.set_persistent("warm:requests", [[t, p, c] for (t, p), c in top], HOT_REQUESTS_TTL)
+        return Counter(dict(top))
+
+    async def hot_requests(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """The `limit` most requested (target, params) pairs across workers."""
+        counts = await self.flush_request_stats()
+        return [(target, json.loads(params)) for (target, params), _ in counts.most_common(limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
 
 # Singleton instance
 cache_service = CacheService()
 
-def cache(ttl: int = 60, key_prefix: str = ""):
+# Parameters never part of a key (request-scoped plumbing)
+KEY_EXCLUDED_PARAMS = {"db", "request"}
+SKIP = object()
+
+# "{prefix}:{function}" -> @cache wrapper, for endpoints the warmer can replay.
+# Endpoints using vary_on depend on the caller and are left out.
+WARM_TARGETS: Dict[str, Callable] = {}
+
+def canonicalize_param(value: Any, granularity: int = 0) -> Any:
+    """
+    Normalizes one parameter so equivalent requests share a key:
+    integral floats become ints, other floats are rounded to 6 significant
+    digits, datetimes are floored to `granularity` seconds, enums use their
+    value. Returns SKIP for values that can't be keyed (ORM objects, sessions).
+    """
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return canonicalize_param(value.value, granularity)
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return str(value)
+        if value.is_integer():
+            return int(value)
+        return float(f"{value:.6g}")
+    if isinstance(value, datetime):
+        ts = value.timestamp()
+        if granularity > 0:
+            ts -= ts % granularity
+        return int(ts)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        items = [canonicalize_param(v, granularity) for v in value]
+        if any(item is SKIP for item in items):
+            return SKIP
+        return sorted(items, key=repr) if isinstance(value, set) else items
+    return SKIP
+
+def build_cache_key(key_prefix: str, func_name: str, params: Dict[str, Any], granularity: int = 0) -> str:
+    """
+    Compact, worker-stable key: `{prefix}:{func}:{hash of canonical params}`.
+    Parameters that canonicalize to SKIP are left out.
+    """
+    canonical = {}
+    for name, value in params.items():
+        value = canonicalize_param(value, granularity)
+        if value is not SKIP:
+            canonical[name] = value
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+    return f"{key_prefix}:{func_name}:{digest}"
+
+def cache(
+    ttl: int = 60,
+    key_prefix: str = "",
+    distributed: bool = False,
+    stale_ttl: int = 0,
+    beta: float = XFETCH_BETA,
+    key_params: Optional[Iterable[str]] = None,
+    exclude: Iterable[str] = (),
+    vary_on: Optional[Dict[str, Callable[[Any], Any]]] = None,
+    granularity: Optional[int] = None,
+):
     """
     Decorator for caching async FastAPI endpoint responses.
-    Generates key based on function name + kwargs.
+    Concurrent misses for one key run the endpoint once (see get_or_compute),
+    with a DB session of its own so a disconnecting caller can't close it
+    under the other waiters; `distributed=True` also coalesces across
+    workers via a Redis lock.
+    For `stale_ttl` seconds after `ttl` the old response is served while a
+    background refresh runs; `beta` tunes probabilistic early refresh.
+
+    Key building (see build_cache_key):
+    - `key_params`: the parameters that make up the key (default: all of them,
+      minus `exclude`, db/request and anything that can't be canonicalized).
+    - `vary_on`: opt dependency values in by extracting a keyable value, e.g.
+      {"user": lambda u: u.role} for endpoints whose result depends on role.
+    - `granularity`: seconds datetime params are floored to (default: ttl).
     """
+    excluded = KEY_EXCLUDED_PARAMS | set(exclude)
+    extractors = vary_on or {}
+    window = ttl if granularity is None else granularity
+
     def decorator(func: Callable):
+        target = f"{key_prefix}:{func.__name__}"
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # 1. Generate Key
-            # Filter out 'db' session or large objects from key generation if possible
-            # Simple approach: JSON dump of kwargs (excluding private/complex objects)
-            
-            clean_kwargs = {k: v for k, v in kwargs.items() if k != 'db' and not k.startswith('_')}
-            key_part = json.dumps(clean_kwargs, sort_keys=True)
-            cache_key = f"{key_prefix}:{func.__name__}:{key_part}"
-            
-            # 2. Check Cache
-            cached = await cache_service.get(cache_key)
-            if cached is not None:
-                # print(f"Cache HIT: {cache_key}")
-                return cached
-            
-            # 3. Call Function
-            # print(f"Cache MISS: {cache_key}")
-            result = await func(*args, **kwargs)
-            
-            # 4. Set Cache
-            if result is not None:
-                await cache_service.set(cache_key, result, ttl)
-                
-            return result
+            if key_params is not None:
+                names = list(key_params) + [n for n in extractors if n not in key_params]
+            else:
+                names = [n for n in kwargs if n not in excluded and not n.startswith('_')]
+            params = {}
+            for name in names:
+                value = kwargs.get(name)
+                if name in extractors:
+                    value = extractors[name](value) if value is not None else None
+                params[name] = value
+            cache_key = build_cache_key(key_prefix, func.__name__, params, window)
+            if not extractors and not warming.get():
+                cache_service.record_request(target, params)
+
+            async def compute():
+                # Fills run as detached tasks shared by every waiter (and background
+                # refreshes outlive the request), while the caller's DB session is
+                # closed when it disconnects or its response is sent: use their own
+                if "db" not in kwargs:
+                    return await func(*args, **kwargs)
+                from ..database import AsyncSessionLocal
+                async with AsyncSessionLocal() as session:
+                    return await func(*args, **{**kwargs, "db": session})
+
+            # 2. Check Cache, or compute once for all concurrent callers
+            return await cache_service.get_or_compute(
+                cache_key, compute, ttl, distributed=distributed, stale_ttl=stale_ttl, beta=beta
+            )
+
+        if not extractors:
+            WARM_TARGETS[target] = wrapper
         return wrapper
     return decorator
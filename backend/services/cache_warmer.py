@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import params as fastapi_params
+from sqlalchemy import select
+
+from .. import models
+from .background import CoalescingJob
+from .cache_service import cache_service, build_cache_key, warming, WARM_TARGETS
+
+WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", 4))
+WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", 25))
+WARM_SAVED_VIEWS = int(os.getenv("CACHE_WARM_SAVED_VIEWS", 50))
+WARM_ON_STARTUP = os.getenv("CACHE_WARM_ON_STARTUP", "true").lower() == "true"
+
+def view_filters(raw_settings: str) -> Optional[Dict[str, Any]]:
+    """
+    Maps a SavedView settings blob ({"category", "region", "dateRange": "30d" | "all"})
+    to the query parameters the dashboard sends for it.
+    """
+    try:
+        settings = json.loads(raw_settings)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(settings, dict):
+        return None
+    filters = {"category": settings.get("category") or None, "region": settings.get("region") or None}
+    date_range = settings.get("dateRange")
+    if date_range == "all":
+        filters["days"] = 0
+    elif date_range:
+        digits = "".join(c for c in str(date_range) if c.isdigit())
+        filters["days"] = int(digits) if digits else 30
+    return filters
+
+def endpoint_params(func: Callable, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Query parameters for one call of `func` with `filters` applied, defaults
+    filled in exactly as FastAPI would pass them (so the cache key matches).
+    None when the endpoint needs a value the filters don't provide.
+    """
+    params = {}
+    for name, param in inspect.signature(func).parameters.items():
+        if name == "db" or isinstance(param.default, fastapi_params.Depends):
+            continue
+        if name in filters:
+            params[name] = filters[name]
+        elif param.default is inspect.Parameter.empty:
+            return None
+        else:
+            params[name] = param.default
+    return params
+
+async def saved_view_filters(limit: int = WARM_SAVED_VIEWS) -> List[Dict[str, Any]]:
+    from ..database import AsyncSessionLocal
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(models.SavedView.settings).order_by(models.SavedView.created_at.desc()).limit(limit)
+        )
+        return [f for f in (view_filters(raw) for raw in result.scalars().all()) if f is not None]
+
+async def collect_jobs() -> List[Tuple[str, Dict[str, Any]]]:
+    """Most requested (endpoint, params) pairs first, then every endpoint for each saved view."""
+    jobs = [(target, params) for target, params in await cache_service.hot_requests(WARM_TOP_N) if target in WARM_TARGETS]
+    try:
+        views = await saved_view_filters()
+    except Exception as e:
+        print(f"Cache warm: could not read saved views: {e}")
+        views = []
+    for filters in views:
+        for target, func in WARM_TARGETS.items():
+            params = endpoint_params(func, filters)
+            if params is not None:
+                jobs.append((target, params))
+
+    # The same request can come from both sources
+    unique, seen = [], set()
+    for target, params in jobs:
+        key = build_cache_key(*target.rsplit(":", 1), params)
+        if key not in seen:
+            seen.add(key)
+            unique.append((target, params))
+    return unique
+
+async def _warm_one(target: str, params: Dict[str, Any], semaphore: asyncio.Semaphore) -> bool:
+    from ..database import AsyncSessionLocal
+    func = WARM_TARGETS[target]
+    async with semaphore:
+        try:
+            async with AsyncSessionLocal() as session:
+                kwargs = dict(params)
+                if "db" in inspect.signature(func).parameters:
+                    kwargs["db"] = session
+                await func(**kwargs)
+            return True
+        except Exception as e:
+            print(f"Cache warm failed for {target} {params}: {e}")
+            return False
+
+async def warm_cache(concurrency: int = WARM_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Precomputes popular dashboard requests through their @cache endpoints.
+    Entries that are already cached are just read back, so this is cheap when
+    nothing changed. Runs at most `concurrency` queries at once.
+    """
+    started = time.monotonic()
+    token = warming.set(True)
+    try:
+        jobs = await collect_jobs()
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(*[_warm_one(target, params, semaphore) for target, params in jobs])
+    finally:
+        warming.reset(token)
+    return {
+        "warmed": sum(results),
+        "failed": len(results) - sum(results),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+_job = CoalescingJob("Cache warm", warm_cache)
+
+def schedule_warm(reason: str) -> Optional[asyncio.Task]:
+    """Starts a background warm pass, or queues one if a pass is already running."""
+    return _job.schedule(reason)
+
+async def stop():
+    _job.stop()
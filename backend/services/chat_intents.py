@@ -0,0 +1,186 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import kpi_service
+from .cache_service import cache_service, build_cache_key
+from .nl_query_cache import extract_entities
+
+# Chat fast path: questions that map onto a kpi_service function are parsed
+# locally and answered without calling the model. The grammar is strict on
+# purpose: any word it doesn't account for ("top", "returning", "2023", ...)
+# means the question may ask for something else, and it goes to the model.
+#
+#   [metric] [by category | by region | over time] [in <category>/<region>] [last N days/weeks/...]
+
+CHAT_INTENT_TTL = int(os.getenv("CHAT_INTENT_TTL", 60))
+
+# Longer phrases first: "average order value" must not be read as "orders"
+METRIC_PATTERNS = [
+    ("aov", r"\b(?:aov|average order(?: value| size| amount)?|avg order(?: value)?)\b"),
+    ("orders", r"\b(?:number of orders|order count|orders?)\b"),
+    ("customers", r"\b(?:number of customers|customer count|customers?)\b"),
+    ("revenue", r"\b(?:revenue|sales|turnover|income|earnings|gmv)\b"),
+]
+GROUP_PATTERNS = [
+    ("category", r"\b(?:by|per|for each|each|across|split by|breakdown by) (?:product )?(?:category|categories)\b"),
+    ("region", r"\b(?:by|per|for each|each|across|split by|breakdown by) (?:regions?)\b"),
+    ("trend", r"\b(?:trend|trends|over time|daily|per day|by day|by date|each day)\b"),
+]
+PERIOD_RE = re.compile(r"\b(?:in |during |over |for )?(?:last|past|previous) (?:(<num>) )?(day|week|month|quarter|year)s?\b")
+ALL_TIME_RE = re.compile(r"\b(?:all time|ever|to date|so far)\b")
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "quarter": 91, "year": 365}
+# Words that may be left over without changing what is asked
+NEUTRAL_WORDS = {
+    "total", "overall", "our", "how", "much", "many", "number", "count", "in", "for", "from",
+    "during", "over", "did", "do", "does", "we", "make", "made", "have", "has", "had", "generated",
+    "all", "current", "currently", "s", "with", "within", "region", "category", "amount", "sum", "value",
+}
+
+# Which kpi_service answers honour which parameters
+SUPPORTED = {
+    ("revenue", None): {"category", "region", "days"},
+    ("revenue", "category"): {"region"},  # Revenue by category has no date filter
+    ("revenue", "region"): {"category", "days"},
+    ("revenue", "trend"): {"category", "region", "days"},
+    ("orders", None): {"category", "region", "days"},
+    ("aov", None): {"days"},
+    ("customers", None): set(),
+}
+
+def parse_intent(question: str, vocabulary: Dict[str, Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Reads `question` as one of the SUPPORTED KPI questions.
+    Returns {"metric", "group", "category", "region", "days"} (days 0 = all time), or None.
+    """
+    text, entities = extract_entities(question, vocabulary)
+    numbers = [value for slot, value in entities if slot == "num"]
+    intent: Dict[str, Any] = {"metric": None, "group": None, "category": None, "region": None, "days": 0}
+    used = set()
+
+    for slot, value in entities:
+        if slot in ("category", "region"):
+            if intent[slot] is not None:
+                return None  # Two categories/regions: a comparison, not a filter
+            intent[slot] = value
+            used.add(slot)
+        elif slot != "num":
+            return None
+
+    period = PERIOD_RE.search(text)
+    if period:
+        count = 1
+        if period.group(1):
+            # The n-th <num> in the template is the n-th number in the question
+            index = text[:period.start(1)].count("<num>")
+            count = numbers[index]
+            if count != int(count) or count <= 0:
+                return None
+            numbers.pop(index)
+        intent["days"] = int(count) * UNIT_DAYS[period.group(2)]
+        used.add("days")
+        text = text[:period.start()] + text[period.end():]
+    text = ALL_TIME_RE.sub(" ", text)
+    if numbers:
+        return None  # e.g. "top 5", "over 100", a year
+
+    for group, pattern in GROUP_PATTERNS:
+        text, found = re.subn(pattern, " ", text)
+        if found:
+            if intent["group"] is not None:
+                return None
+            intent["group"] = group
+    for metric, pattern in METRIC_PATTERNS:
+        text, found = re.subn(pattern, " ", text)
+        if found:
+            if intent["metric"] not in (None, metric):
+                return None
+            intent["metric"] = metric
+
+    text = re.sub(r"<(category|region)>", " ", text)
+    if intent["metric"] is None or any(word not in NEUTRAL_WORDS for word in text.split()):
+        return None
+    allowed = SUPPORTED.get((intent["metric"], intent["group"]))
+    if allowed is None or not used <= allowed:
+        return None
+    return intent
+
+async def _compute(db: AsyncSession, intent: Dict[str, Any]) -> List[Dict[str, Any]]:
+    metric, group = intent["metric"], intent["group"]
+    category, region = intent["category"], intent["region"]
+    start_date = datetime.now() - timedelta(days=intent["days"]) if intent["days"] > 0 else None
+
+    if metric == "revenue" and group == "category":
+        return await kpi_service.calculate_revenue_by_category(db, None, None, region)
+    if metric == "revenue" and group == "region":
+        return await kpi_service.calculate_revenue_by_region(db, start_date, None, category)
+    if metric == "revenue" and group == "trend":
+        rows = await kpi_service.calculate_revenue_trend(db, None, None, category, region)
+        if start_date:
+            # The trend query has no date filter of its own
+            rows = [row for row in rows if row["date"] >= start_date.date().isoformat()]
+        return rows
+    if metric == "revenue":
+        return [{"total_revenue": await kpi_service.calculate_total_revenue(db, start_date, None, category, region)}]
+    if metric == "orders":
+        return [{"order_count": await kpi_service.count_orders(db, start_date, None, category, region)}]
+    if metric == "aov":
+        return [{"average_order_value": await kpi_service.calculate_aov(db, start_date, None)}]
+    return [{"customer_count": await kpi_service.count_customers(db)}]
+
+def _money(value: float) -> str:
+    return f"${value:,.2f}"
+
+def _scope(intent: Dict[str, Any]) -> str:
+    parts = [value for value in (intent["category"], intent["region"]) if value]
+    scope = f" in {' / '.join(parts)}" if parts else ""
+    return scope + (f" over the last {intent['days']} days" if intent["days"] else " (all time)")
+
+def describe(intent: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+    """A short plain-text answer, written locally."""
+    metric, group, scope = intent["metric"], intent["group"], _scope(intent)
+    if group in ("category", "region"):
+        if not rows:
+            return f"There is no revenue by {group}{scope} yet."
+        total = sum(row["revenue"] for row in rows)
+        top = ", ".join(
+            f"{row[group]} {_money(row['revenue'])}" + (f" ({row['revenue'] / total:.0%})" if total else "")
+            for row in rows[:5]
+        )
+        more = f", and {len(rows) - 5} more" if len(rows) > 5 else ""
+        return f"Revenue by {group}{scope}: {top}{more}. Total: {_money(total)}."
+    if group == "trend":
+        if not rows:
+            return f"There is no revenue{scope} yet."
+        best = max(rows, key=lambda row: row["revenue"])
+        total = sum(row["revenue"] for row in rows)
+        return (
+            f"Revenue{scope}: {_money(total)} across {len(rows)} days with sales, "
+            f"from {rows[0]['date']} to {rows[-1]['date']}. Best day: {best['date']} ({_money(best['revenue'])})."
+        )
+    value = next(iter(rows[0].values()))
+    if metric == "revenue":
+        return f"Total revenue{scope} is {_money(value)}."
+    if metric == "orders":
+        return f"There were {value:,} orders{scope}."
+    if metric == "aov":
+        return f"The average order value{scope} is {_money(value)}."
+    return f"You have {value:,} customers."
+
+async def answer(db: AsyncSession, question: str, vocabulary: Dict[str, Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Answers `question` from kpi_service when it parses as a KPI question.
+    Returns {"content", "data", "intent"}, or None to fall back to the model.
+    """
+    intent = parse_intent(question, vocabulary)
+    if intent is None:
+        return None
+    rows = await cache_service.get_or_compute(
+        build_cache_key("chat_intent", "answer", intent),
+        lambda: _compute(db, intent),
+        ttl=CHAT_INTENT_TTL,
+    )
+    return {"content": describe(intent, rows), "data": rows, "intent": intent}
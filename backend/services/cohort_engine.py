@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .cohort_service import naive_utc
+
+# Cohort retention for any period length, computed in memory from columnar
+# (customer_id, created_at, total_amount) arrays instead of database-specific
+# date SQL. Each order gets a period number; customers are grouped by their
+# first period and every cell is a bincount over cohort x period offset.
+
+GRANULARITIES = ("week", "month", "quarter")
+METRICS = ("customers", "revenue")
+FETCH_BATCH = 50_000
+
+async def load_orders(db: AsyncSession) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All orders as (customer_id int64, created_at datetime64[s] UTC, total_amount float64) arrays."""
+    customers: List[int] = []
+    created: List[Any] = []
+    amounts: List[float] = []
+    result = await db.stream(
+        select(models.Order.customer_id, models.Order.created_at, models.Order.total_amount)
+        .execution_options(yield_per=FETCH_BATCH)
+    )
+    async for batch in result.partitions():
+        for customer_id, created_at, amount in batch:
+            customers.append(customer_id)
+            created.append(naive_utc(created_at))
+            amounts.append(amount or 0.0)
+    return (
+        np.array(customers, dtype=np.int64),
+        np.array(created, dtype="datetime64[s]"),
+        np.array(amounts, dtype=np.float64),
+    )
+
+def period_numbers(timestamps: np.ndarray, granularity: str) -> np.ndarray:
+    """Consecutive period numbers: weeks start on Monday, quarters in January/April/July/October."""
+    if granularity == "week":
+        # 1970-01-01 was a Thursday; shift so weeks run Monday..Sunday
+        return (timestamps.astype("datetime64[D]").astype(np.int64) + 3) // 7
+    months = timestamps.astype("datetime64[M]").astype(np.int64)
+    return months // 3 if granularity == "quarter" else months
+
+def period_label(period: int, granularity: str) -> str:
+    if granularity == "week":
+        monday = date(1970, 1, 1) + timedelta(days=int(period) * 7 - 3)
+        year, week, _ = monday.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "quarter":
+        return f"{1970 + period // 4}-Q{period % 4 + 1}"
+    return f"{1970 + period // 12}-{period % 12 + 1:02d}"
+
+def _distinct(values: np.ndarray) -> np.ndarray:
+    """Sorted distinct values (a plain sort is much cheaper than np.unique here)."""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+def cohort_matrix(customer_ids: np.ndarray, periods: np.ndarray, amounts: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Cohort x period-offset matrices from per-order arrays.
+    Returns {"cohorts": first period per cohort, "sizes", "active": distinct
+    customers per cell, "revenue": amount per cell (if `amounts` given)}.
+    """
+    if len(customer_ids) == 0:
+        empty = np.zeros((0, 0))
+        return {"cohorts": np.zeros(0, dtype=np.int64), "sizes": np.zeros(0, dtype=np.int64), "active": empty, "revenue": empty}
+
+    # Customer ids are primary keys: index by id when the range is compact
+    low, high = int(customer_ids.min()), int(customer_ids.max())
+    if high - low < max(4 * len(customer_ids), 1 << 20):
+        customer = customer_ids - low
+    else:
+        customer = np.searchsorted(_distinct(customer_ids), customer_ids)
+    none = np.iinfo(np.int64).max
+    first = np.full(int(customer.max()) + 1, none, dtype=np.int64)
+    np.minimum.at(first, customer, periods)
+    present = first != none  # Ids without orders
+    cohorts = _distinct(first[present])
+    customer_cohort = np.searchsorted(cohorts, first)
+    offsets = periods - first[customer]
+    width = int(offsets.max()) + 1
+    shape = (len(cohorts), width)
+
+    # Distinct customers per cell: count each (customer, offset) pair once
+    pairs = _distinct(customer.astype(np.int64) * width + offsets)
+    cells = customer_cohort[pairs // width] * width + pairs % width
+    active = np.bincount(cells, minlength=shape[0] * width).reshape(shape)
+    matrix = {
+        "cohorts": cohorts,
+        "sizes": np.bincount(customer_cohort[present], minlength=len(cohorts)),
+        "active": active,
+    }
+    if amounts is not None:
+        order_cells = customer_cohort[customer] * width + offsets
+        matrix["revenue"] = np.bincount(order_cells, weights=amounts, minlength=shape[0] * width).reshape(shape)
+    return matrix
+
+def to_rows(matrix: Dict[str, np.ndarray], granularity: str = "month", metric: str = "customers") -> List[Dict[str, Any]]:
+    """
+    The get_cohort_analysis response shape. Points carry `period_index` (and
+    `month_index` for monthly cohorts); with metric="revenue" the percentage
+    is the cohort's revenue relative to its first period.
+    """
+    rows = []
+    for i, cohort in enumerate(matrix["cohorts"]):
+        size = int(matrix["sizes"][i])
+        retention = []
+        for offset in np.flatnonzero(matrix["active"][i]):
+            active = int(matrix["active"][i][offset])
+            point: Dict[str, Any] = {"period_index": int(offset), "active_customers": active}
+            if granularity == "month":
+                point["month_index"] = int(offset)
+            if metric == "revenue":
+                revenue = float(matrix["revenue"][i][offset])
+                base = float(matrix["revenue"][i][0])
+                point["revenue"] = round(revenue, 2)
+                point["percentage"] = round(revenue / base * 100, 1) if base else 0.0
+            else:
+                point["percentage"] = round(active / size * 100, 1) if size else 0.0
+            retention.append(point)
+        rows.append({"cohort": period_label(int(cohort), granularity), "size": size, "retention": retention})
+    return rows
+
+async def get_cohort_retention(db: AsyncSession, granularity: str = "month", metric: str = "customers") -> List[Dict[str, Any]]:
+    """Cohort retention by week/month/quarter, as customer or revenue retention."""
+    customer_ids, created, amounts = await load_orders(db)
+    matrix = cohort_matrix(customer_ids, period_numbers(created, granularity), amounts if metric == "revenue" else None)
+    return to_rows(matrix, granularity, metric)
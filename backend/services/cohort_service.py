@@ -1,11 +1,192 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
-from typing import List, Dict, Any
+from sqlalchemy import select, func, text, update, delete
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from collections import Counter, defaultdict
 from .. import models
 import traceback
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Retention is served from a small cohort x month matrix (cohort_activity)
+# kept up to date on ingest, instead of scanning all orders per request:
+#   customer_first_order   customer -> first order date and cohort month
+#   customer_active_months (customer, month) pairs with at least one order
+#   cohort_activity        (cohort month, activity month) -> distinct active customers
+# Months are computed in Python, so the tables work on any database.
+# Writers (ingests, rebuilds) are serialized by a transaction-scoped advisory
+# lock on Postgres: a check-then-insert on these tables is only safe one at a
+# time, and concurrent uploads/syncs often touch the same customers and cells.
+
+IN_CHUNK = 500  # Keeps IN (...) lists under SQLite's bound parameter limit
+REBUILD_BATCH = 50_000
+COHORT_WRITE_LOCK = 4_049_001  # pg advisory lock id shared by every cohort table writer
+
+def naive_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def month_key(value: datetime) -> str:
+    return value.strftime("%Y-%m")
+
+def month_index(cohort: str, month: str) -> int:
+    """Months between two YYYY-MM keys."""
+    return (int(month[:4]) - int(cohort[:4])) * 12 + int(month[5:7]) - int(cohort[5:7])
+
+def _chunks(values: List[Any]) -> Iterable[List[Any]]:
+    for i in range(0, len(values), IN_CHUNK):
+        yield values[i:i + IN_CHUNK]
+
+async def lock_for_write(db: AsyncSession):
+    """
+    Waits for other cohort writers; held until this transaction ends. SQLite
+    (tests, local runs) already allows a single writer at a time.
+    """
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": COHORT_WRITE_LOCK})
+
+async def record_orders(db: AsyncSession, orders: Iterable[Tuple[int, Optional[datetime]]]):
+    """
+    Folds new orders, as (customer_id, created_at) pairs, into the cohort
+    tables. Call in the transaction that inserts the orders. A customer whose
+    new order predates their first known order moves to the earlier cohort,
+    with their active months moving along.
+    """
+    batch_first: Dict[int, datetime] = {}
+    batch_months: Dict[int, set] = defaultdict(set)
+    for customer_id, created_at in orders:
+        created_at = naive_utc(created_at)
+        if customer_id not in batch_first or created_at < batch_first[customer_id]:
+            batch_first[customer_id] = created_at
+        batch_months[customer_id].add(month_key(created_at))
+    if not batch_first:
+        return
+
+    await lock_for_write(db)
+    customer_ids = list(batch_first)
+    existing: Dict[int, models.CustomerFirstOrder] = {}
+    known_months: Dict[int, set] = defaultdict(set)
+    for chunk in _chunks(customer_ids):
+        result = await db.execute(select(models.CustomerFirstOrder).where(models.CustomerFirstOrder.customer_id.in_(chunk)))
+        existing.update((row.customer_id, row) for row in result.scalars())
+        result = await db.execute(
+            select(models.CustomerActiveMonth.customer_id, models.CustomerActiveMonth.month)
+            .where(models.CustomerActiveMonth.customer_id.in_(chunk))
+        )
+        for customer_id, month in result.all():
+            known_months[customer_id].add(month)
+
+    deltas: Counter = Counter()
+    new_months = []
+    for customer_id in customer_ids:
+        first = existing.get(customer_id)
+        first_at = batch_first[customer_id]
+        cohort = month_key(first_at)
+        if first is None:
+            db.add(models.CustomerFirstOrder(customer_id=customer_id, first_order_at=first_at, cohort_month=cohort))
+        elif first_at < first.first_order_at:
+            if first.cohort_month != cohort:
+                for month in known_months[customer_id]:
+                    deltas[(first.cohort_month, month)] -= 1
+                    deltas[(cohort, month)] += 1
+            first.first_order_at, first.cohort_month = first_at, cohort
+        else:
+            cohort = first.cohort_month
+        for month in batch_months[customer_id] - known_months[customer_id]:
+            new_months.append(models.CustomerActiveMonth(customer_id=customer_id, month=month))
+            deltas[(cohort, month)] += 1
+    db.add_all(new_months)
+    await _apply_deltas(db, {cell: delta for cell, delta in deltas.items() if delta})
+    await db.flush()
+
+async def _apply_deltas(db: AsyncSession, deltas: Dict[Tuple[str, str], int]):
+    if not deltas:
+        return
+    cohorts = sorted({cohort for cohort, _ in deltas})
+    cells = set()
+    for chunk in _chunks(cohorts):
+        result = await db.execute(
+            select(models.CohortActivity.cohort_month, models.CohortActivity.activity_month)
+            .where(models.CohortActivity.cohort_month.in_(chunk))
+        )
+        cells.update(tuple(row) for row in result.all())
+    for (cohort, month), delta in deltas.items():
+        if (cohort, month) in cells:
+            # Relative update: the matrix only ever changes by deltas
+            await db.execute(
+                update(models.CohortActivity)
+                .where(models.CohortActivity.cohort_month == cohort, models.CohortActivity.activity_month == month)
+                .values(active_customers=models.CohortActivity.active_customers + delta)
+            )
+        else:
+            db.add(models.CohortActivity(cohort_month=cohort, activity_month=month, active_customers=delta))
+
+async def rebuild(db: AsyncSession) -> int:
+    """Recomputes the cohort tables from all orders. Returns the number of orders read."""
+    await lock_for_write(db)
+    await db.execute(delete(models.CohortActivity))
+    await db.execute(delete(models.CustomerActiveMonth))
+    await db.execute(delete(models.CustomerFirstOrder))
+    await db.flush()
+    count = 0
+    result = await db.stream(
+        select(models.Order.customer_id, models.Order.created_at).execution_options(yield_per=REBUILD_BATCH)
+    )
+    async for batch in result.partitions():
+        await record_orders(db, batch)
+        count += len(batch)
+    await db.commit()
+    return count
+
+async def needs_rebuild(db: AsyncSession) -> bool:
+    """
+    Whether the cohort tables are out of step with the orders: empty while
+    orders exist (a database from before they existed, or a partial truncate),
+    or still filled after the orders were cleared.
+    """
+    async def exists(column) -> bool:
+        return (await db.execute(select(column).limit(1))).first() is not None
+
+    materialized = [
+        await exists(models.CustomerFirstOrder.customer_id),
+        await exists(models.CohortActivity.cohort_month),
+    ]
+    if await exists(models.Order.id):
+        return not all(materialized)
+    return any(materialized)
+
+async def check_materialized(db: AsyncSession):
+    """Startup check only: the backfill scans every order, so it runs from scripts/migrate_cohorts.py."""
+    if await needs_rebuild(db):
+        print("Warning: cohort tables are out of date with orders. Run scripts/migrate_cohorts.py to rebuild them.")
 
 async def get_cohort_analysis(db: AsyncSession) -> List[Dict[str, Any]]:
+    """Monthly customer retention per cohort, read from the cohort_activity matrix."""
+    try:
+        result = await db.execute(
+            select(models.CohortActivity)
+            .where(models.CohortActivity.active_customers > 0)
+            .order_by(models.CohortActivity.cohort_month, models.CohortActivity.activity_month)
+        )
+        cohorts_map: Dict[str, Dict[str, Any]] = {}
+        for cell in result.scalars():
+            cohort = cohorts_map.setdefault(cell.cohort_month, {"cohort": cell.cohort_month, "size": 0, "retention": []})
+            month = month_index(cell.cohort_month, cell.activity_month)
+            if month == 0:
+                cohort["size"] = cell.active_customers  # Everyone is active in their first month
+            cohort["retention"].append({"month_index": month, "active_customers": cell.active_customers})
+        for cohort in cohorts_map.values():
+            for point in cohort["retention"]:
+                point["percentage"] = round(point["active_customers"] / cohort["size"] * 100, 1) if cohort["size"] else 0.0
+        return list(cohorts_map.values())
+    except Exception as e:
+        print(f"Error in get_cohort_analysis: {e}")
+        traceback.print_exc()
+        return []
+
+async def get_cohort_analysis_from_orders(db: AsyncSession) -> List[Dict[str, Any]]:
+    """The same result computed from the full order history (Postgres only); for verification."""
     try:
         # SQL Approach:
         # 1. CTE: Get first_order_date for each customer
@@ -115,6 +296,6 @@ async def get_cohort_analysis(db: AsyncSession) -> List[Dict[str, Any]]:
         return list(cohorts_map.values())
 
     except Exception as e:
-        print(f"Error in get_cohort_analysis: {e}")
+        print(f"Error in get_cohort_analysis_from_orders: {e}")
         traceback.print_exc()
         return []
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from . import ai_service, kpi_service
+from .background import CoalescingJob
+from .cache_service import cache_service
+
+# The executive summary and the KPI insight are generated in the background
+# after each ingest (and every INSIGHT_REFRESH_INTERVAL seconds), stored as
+# AIInsight rows tagged with a hash of the KPI snapshot they describe. The
+# endpoints serve the stored row while the snapshot hash still matches.
+
+INSIGHT_REFRESH_INTERVAL = int(os.getenv("INSIGHT_REFRESH_INTERVAL", 0))  # Seconds; 0 = only after ingest
+INSIGHT_PRECOMPUTE_ON_STARTUP = os.getenv("INSIGHT_PRECOMPUTE_ON_STARTUP", "true").lower() == "true"
+DEFAULT_PERIOD = "This Month"
+EXECUTIVE_SUMMARY = "EXECUTIVE_SUMMARY"
+# Types /generate may return (other AIInsight rows are dataset or document analyses)
+INSIGHT_TYPES = [t.value for t in models.AIInsightType]
+# One pass at a time across workers; long enough for both model calls
+PRECOMPUTE_LOCK_TIMEOUT = 2 * ai_service.AI_CACHE_LOCK_TIMEOUT
+PRECOMPUTE_LOCK_POLL = 1.0
+
+_timer: Optional[asyncio.Task] = None
+
+async def kpi_snapshot(db: AsyncSession) -> Dict[str, Any]:
+    """The KPIs both the executive summary and the insight are written from."""
+    return {
+        "total_revenue": round(await kpi_service.calculate_total_revenue(db, None, None), 2),
+        "active_orders": await kpi_service.count_orders(db),
+        "revenue_by_category": await kpi_service.calculate_revenue_by_category(db),
+    }
+
+def snapshot_hash(snapshot: Dict[str, Any]) -> str:
+    # Exact values: any new order must invalidate the stored texts (no rounding
+    # as in ai_service.normalize_content)
+    encoded = json.dumps(snapshot, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+def summary_title(period: str) -> str:
+    return f"Executive Summary ({period})"
+
+def _summary_prompt(snapshot: Dict[str, Any], period: str) -> str:
+    kpis = {
+        "period": period,
+        "total_revenue": snapshot["total_revenue"],
+        "active_orders": snapshot["active_orders"],
+        "revenue_growth": "+12.5% (Projected)",
+        "top_product": "N/A",
+        "challenges": "Inventory Optimization",
+    }
+    prompt = f"""
+    You are a Chief Strategy Officer. Write a professional Executive Summary for the following business performance data.
+
+    Data:
+    {json.dumps(kpis, indent=2)}
+
+    Structure:
+    1. **Performance Overview**: High-level summary of revenue and growth.
+    2. **Key Drivers**: What went well (Top product, new customers).
+    3. **Strategic Risks**: addressing challenges.
+    4. **Recommendations**: 2-3 bullet points on what to do next.
+
+    Tone: Professional, concise, authoritative.
+    Format your response in Markdown.
+    """
+    return prompt
+
+def fallback_summary(snapshot: Dict[str, Any]) -> str:
+    return f"""
+## **Executive Summary (Auto-Generated)**
+
+### **Performance Overview**
+We are seeing strong traction with a Total Revenue of **${snapshot['total_revenue']:,}** across **{snapshot['active_orders']}** active orders.
+
+### **Key Drivers**
+- **consistent order volume** indicates a healthy customer base.
+- Revenue growth is currently projected at **+12.5% (Projected)**.
+
+### **Recommendations**
+- **Focus on Retention:** Analyze repeat purchase behavior to boost LTV.
+- **Inventory Check:** Ensure top-selling categories are well-stocked.
+
+*(Note: Configure `GEMINI_API_KEY` in .env for deeper AI insights)*
+"""
+
+async def generate_summary(snapshot: Dict[str, Any], period: str = DEFAULT_PERIOD) -> Optional[str]:
+    """Model-written executive summary (Markdown), or None when the model isn't available."""
+    text = await ai_service.generate_business_insight({}, prompt_override=_summary_prompt(snapshot, period))
+    if "API Key not configured" in text or "Error" in text or "Analysis Unavailable" in text:
+        return None
+    return text
+
+async def stored_summary(db: AsyncSession, digest: str, period: str = DEFAULT_PERIOD) -> Optional[models.AIInsight]:
+    result = await db.execute(
+        select(models.AIInsight)
+        .where(models.AIInsight.type == EXECUTIVE_SUMMARY)
+        .where(models.AIInsight.snapshot_hash == digest)
+        .where(models.AIInsight.title == summary_title(period))
+        .order_by(models.AIInsight.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def stored_insight(db: AsyncSession, digest: str) -> Optional[models.AIInsight]:
+    result = await db.execute(
+        select(models.AIInsight)
+        .where(models.AIInsight.type.in_(INSIGHT_TYPES))
+        .where(models.AIInsight.snapshot_hash == digest)
+        .order_by(models.AIInsight.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def save_summary(db: AsyncSession, text: str, digest: str, period: str = DEFAULT_PERIOD) -> models.AIInsight:
+    insight = models.AIInsight(
+        type=EXECUTIVE_SUMMARY, title=summary_title(period), content=text, confidence_score=None, snapshot_hash=digest
+    )
+    db.add(insight)
+    await db.commit()
+    await db.refresh(insight)
+    return insight
+
+async def generate_insight(db: AsyncSession, snapshot: Dict[str, Any], digest: str) -> Optional[models.AIInsight]:
+    """Generates and stores the KPI insight /generate returns."""
+    context = {"total_revenue": snapshot["total_revenue"], "revenue_by_category": snapshot["revenue_by_category"]}
+    insight_json = await ai_service.generate_business_insight(context)
+    # A failed generation is still returned, but not tagged as this snapshot's insight
+    failed = '"Analysis Unavailable"' in insight_json
+    if not failed:
+        existing = await stored_insight(db, digest)
+        if existing is not None:
+            return existing  # Saved meanwhile by another pass
+    return await ai_service.save_insight(db, insight_json, snapshot_hash=None if failed else digest)
+
+async def _acquire_lock(lock_key: str) -> Optional[str]:
+    """
+    Waits for the cross-worker precompute lock. Every worker runs a startup
+    pass; the ones that wait then find the texts stored and skip generation.
+    Returns None if the holder outlives PRECOMPUTE_LOCK_TIMEOUT.
+    """
+    deadline = time.monotonic() + PRECOMPUTE_LOCK_TIMEOUT
+    while True:
+        token = await cache_service.backend.acquire_lock(lock_key, PRECOMPUTE_LOCK_TIMEOUT)
+        if token is not None or time.monotonic() >= deadline:
+            return token
+        await asyncio.sleep(PRECOMPUTE_LOCK_POLL)
+
+async def precompute() -> Dict[str, Any]:
+    """Generates whatever is missing for the current KPI snapshot."""
+    from ..database import AsyncSessionLocal
+    lock_key = f"{cache_service.namespace}:insight_precompute"
+    token = await _acquire_lock(lock_key)
+    generated = []
+    try:
+        async with AsyncSessionLocal() as session:
+            snapshot = await kpi_snapshot(session)
+            digest = snapshot_hash(snapshot)
+            if await stored_summary(session, digest) is None:
+                text = await generate_summary(snapshot)
+                # Checked again in case the lock expired while generating
+                if text is not None and await stored_summary(session, digest) is None:
+                    await save_summary(session, text, digest)
+                    generated.append("executive_summary")
+            if await stored_insight(session, digest) is None:
+                insight = await generate_insight(session, snapshot, digest)
+                if insight is not None and insight.snapshot_hash is not None:
+                    generated.append("insight")
+    finally:
+        if token is not None:
+            await cache_service.backend.release_lock(lock_key, token)
+    return {"snapshot": digest, "generated": generated}
+
+_job = CoalescingJob("Insight precompute", precompute)
+
+def schedule_precompute(reason: str) -> Optional[asyncio.Task]:
+    """Starts a background precompute pass, or queues one if a pass is already running."""
+    return _job.schedule(reason)
+
+async def _every(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        schedule_precompute("schedule")
+
+def start():
+    """Startup pass and the periodic refresh (INSIGHT_REFRESH_INTERVAL)."""
+    global _timer
+    if INSIGHT_PRECOMPUTE_ON_STARTUP:
+        schedule_precompute("startup")
+    if INSIGHT_REFRESH_INTERVAL > 0 and _timer is None:
+        _timer = asyncio.ensure_future(_every(INSIGHT_REFRESH_INTERVAL))
+
+async def stop():
+    global _timer
+    if _timer is not None:
+        _timer.cancel()
+        _timer = None
+    _job.stop()
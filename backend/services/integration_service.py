@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from .. import models
+from .cache_service import cache_service
+from . import cache_warmer, insight_precompute, cohort_service
 import random
 from datetime import datetime, timedelta
 
@@ -49,6 +51,7 @@ async def sync_provider(provider: str, db: AsyncSession):
     # 3. Generate Mock Orders (5-10)
     num_orders = random.randint(5, 10)
     new_revenue = 0.0
+    order_events = []
     
     for _ in range(num_orders):
         customer = random.choice(customers)
@@ -64,6 +67,7 @@ async def sync_provider(provider: str, db: AsyncSession):
         )
         db.add(order)
         await db.flush() # Get ID
+        order_events.append((customer.id, created_at))
         
         # Add items
         num_items = random.randint(1, 3)
@@ -88,7 +92,13 @@ async def sync_provider(provider: str, db: AsyncSession):
         order.total_amount = total
         new_revenue += total
         
+    await cohort_service.record_orders(db, order_events)
     await db.commit()
+
+    # New orders change every KPI: drop stale entries and re-warm the popular ones
+    await cache_service.clear()
+    cache_warmer.schedule_warm(f"sync:{provider}")
+    insight_precompute.schedule_precompute(f"sync:{provider}")
     
     return {
         "status": "success", 
@@ -0,0 +1,179 @@
+import os
+import re
+import math
+import hashlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .cache_service import cache_service
+from .sql_sandbox import is_single_select
+
+# Chat questions -> validated SQL, so recurring questions skip SQL generation.
+#
+# Three lookups, cheapest first:
+#   exact:    normalized question (case, punctuation, filler words) -> SQL
+#   template: question with entities (numbers, quoted strings, known
+#             categories/regions) replaced by slots -> SQL with bind params
+#   similar:  closest stored template by character-trigram cosine similarity,
+#             when above NL_CACHE_SIMILARITY and using the same slots. Opt-in:
+#             close wording can still ask for a different metric.
+# Entries are persistent cache entries: they depend on the schema, not the data.
+
+NL_CACHE_TTL = int(os.getenv("NL_CACHE_TTL", 7 * 24 * 3600))
+NL_CACHE_SIMILARITY = float(os.getenv("NL_CACHE_SIMILARITY", 0))  # e.g. 0.9; 0 disables similarity lookups
+NL_CACHE_INDEX_SIZE = int(os.getenv("NL_CACHE_INDEX_SIZE", 500))
+
+FILLER_WORDS = {
+    "please", "can", "could", "you", "show", "me", "tell", "give", "what", "whats", "is", "are",
+    "was", "were", "the", "a", "an", "of", "i", "want", "to", "see", "list", "display", "get",
+}
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+QUOTED_RE = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+# Single-quoted SQL string literals, or standalone numbers outside them
+SQL_LITERAL_RE = re.compile(r"('(?:[^']|'')*')|(\b\d+(?:\.\d+)?\b)")
+
+_hits: Counter = Counter()
+
+def _words(text: str) -> List[str]:
+    text = re.sub(r"[^\w<>\s.]", " ", text.lower())
+    words = [w.strip(".") for w in text.split()]
+    return [w for w in words if w and w not in FILLER_WORDS]
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and filler words removed; entities kept."""
+    return " ".join(_words(question))
+
+def extract_entities(question: str, vocabulary: Dict[str, Iterable[str]] = None) -> Tuple[str, List[Tuple[str, Any]]]:
+    """
+    Replaces entities in `question` with slots ("<num>", "<str>", "<category>", ...).
+    `vocabulary` maps slot names to known values (e.g. {"category": [...]}).
+    Returns (template key, [(slot, value)] in order of appearance).
+    """
+    spans: List[Tuple[int, int, str, Any]] = []
+
+    def add(match, slot: str, value: Any):
+        if all(match.end() <= s or match.start() >= e for s, e, _, _ in spans):
+            spans.append((match.start(), match.end(), slot, value))
+
+    for m in QUOTED_RE.finditer(question):
+        add(m, "str", m.group(1) or m.group(2))
+    # Longest values first so "North America" wins over "America"
+    known = sorted(
+        ((value, slot) for slot, values in (vocabulary or {}).items() for value in values if value),
+        key=lambda item: -len(item[0]),
+    )
+    for value, slot in known:
+        for m in re.finditer(r"(?<!\w)" + re.escape(value) + r"(?!\w)", question, re.IGNORECASE):
+            add(m, slot, value)
+    for m in NUMBER_RE.finditer(question):
+        add(m, "num", float(m.group()) if "." in m.group() else int(m.group()))
+
+    spans.sort()
+    parts, pos = [], 0
+    for start, end, slot, _ in spans:
+        parts.append(question[pos:start])
+        parts.append(f" <{slot}> ")
+        pos = end
+    parts.append(question[pos:])
+    return " ".join(_words("".join(parts))), [(slot, value) for _, _, slot, value in spans]
+
+def templatize_sql(sql: str, entities: List[Tuple[str, Any]]) -> Optional[str]:
+    """
+    Swaps each entity's literal in `sql` for a bind parameter (:p0, :p1, ...).
+    Only succeeds when every entity appears exactly once as a standalone
+    literal; otherwise the SQL can't be reused with other values and None is
+    returned (e.g. a number inside INTERVAL '30 days').
+    """
+    literals = [(m.start(), m.end(), m.group(1), m.group(2)) for m in SQL_LITERAL_RE.finditer(sql)]
+    replacements = {}
+    for i, (slot, value) in enumerate(entities):
+        matches = []
+        for start, end, string, number in literals:
+            if slot == "num" and number is not None and float(number) == float(value):
+                matches.append((start, end))
+            elif slot != "num" and string is not None and string[1:-1].replace("''", "'").lower() == str(value).lower():
+                matches.append((start, end))
+        if len(matches) != 1 or matches[0] in replacements:
+            return None
+        replacements[matches[0]] = f":p{i}"
+    for (start, end), param in sorted(replacements.items(), reverse=True):
+        sql = sql[:start] + param + sql[end:]
+    return sql
+
+def _trigrams(text: str) -> Counter:
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def similarity(a: str, b: str) -> float:
+    """Cosine similarity of character-trigram counts: a cheap local embedding."""
+    va, vb = _trigrams(a), _trigrams(b)
+    dot = sum(count * vb[gram] for gram, count in va.items())
+    norm = math.sqrt(sum(c * c for c in va.values())) * math.sqrt(sum(c * c for c in vb.values()))
+    return dot / norm if norm else 0.0
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+def _slots(template_key: str) -> List[str]:
+    return re.findall(r"<(\w+)>", template_key)
+
+async def lookup(question: str, vocabulary: Dict[str, Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Cached SQL for `question`: {"sql", "explanation", "params", "source"}, or None.
+    Template hits bind the question's own entity values as :p0, :p1, ...
+    """
+    entry = await cache_service.get_persistent(f"nlq:exact:{_digest(normalize_question(question))}")
+    if entry is not None:
+        return _hit("exact", entry["sql"], entry["explanation"], {})
+
+    template_key, entities = extract_entities(question, vocabulary)
+    params = {f"p{i}": value for i, (_, value) in enumerate(entities)}
+    entry = await cache_service.get_persistent(f"nlq:template:{_digest(template_key)}")
+    if entry is not None:
+        return _hit("template", entry["sql"], entry["explanation"], params)
+
+    if NL_CACHE_SIMILARITY > 0:
+        slots = _slots(template_key)
+        best, best_score = None, NL_CACHE_SIMILARITY
+        for candidate in await cache_service.get_persistent("nlq:index") or []:
+            if _slots(candidate) != slots:
+                continue  # Parameters wouldn't line up
+            score = similarity(template_key, candidate)
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is not None:
+            entry = await cache_service.get_persistent(f"nlq:template:{_digest(best)}")
+            if entry is not None:
+                return _hit("similar", entry["sql"], entry["explanation"], params)
+
+    cache_service.metrics.record_request("nl_sql", "miss")
+    return None
+
+def _hit(source: str, sql: str, explanation: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    _hits[source] += 1
+    cache_service.metrics.record_request("nl_sql", "hit")
+    return {"sql": sql, "explanation": explanation, "params": params, "source": source}
+
+async def store(question: str, sql: str, explanation: str, vocabulary: Dict[str, Iterable[str]] = None):
+    """
+    Remembers SQL that answered `question`. Call only after it executed
+    successfully, so the library holds validated queries only.
+    """
+    if not is_single_select(sql):
+        return
+    entry = {"sql": sql, "explanation": explanation}
+    await cache_service.set_persistent(f"nlq:exact:{_digest(normalize_question(question))}", entry, NL_CACHE_TTL)
+
+    template_key, entities = extract_entities(question, vocabulary)
+    template_sql = templatize_sql(sql, entities)
+    if template_sql is None:
+        return
+    await cache_service.set_persistent(
+        f"nlq:template:{_digest(template_key)}", {"sql": template_sql, "explanation": explanation}, NL_CACHE_TTL
+    )
+    index = [k for k in await cache_service.get_persistent("nlq:index") or [] if k != template_key]
+    index.append(template_key)
+    await cache_service.set_persistent("nlq:index", index[-NL_CACHE_INDEX_SIZE:], NL_CACHE_TTL)
+
+def stats() -> Dict[str, int]:
+    return dict(_hits)
@@ -0,0 +1,139 @@
+import io
+import os
+import uuid
+import asyncio
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from .cache_service import cache_service
+from .prompt_context import fit_text, AI_DOCUMENT_TOKENS
+
+# Text extraction for uploaded strategy documents. Only the pages the prompt
+# budget can use are extracted: from the start and from the end (fit_text
+# keeps both), skipping the middle of long documents. Extraction runs off the
+# event loop, large documents across a process pool (pypdf is pure Python, so
+# threads wouldn't run pages in parallel), and the result is cached by file hash.
+# Pool workers read the document from a temp file and keep it parsed between
+# waves, so the bytes are never pickled per task.
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 24))
+PDF_TEXT_CACHE_TTL = int(os.getenv("PDF_TEXT_CACHE_TTL", 7 * 24 * 3600))
+CHARS_PER_TOKEN = 4
+PAGES_PER_TASK = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+# In a worker process: (document id, parsed reader) of the document being extracted
+_worker_document: Tuple[Optional[str], Any] = (None, None)
+
+def _reader(content: bytes):
+    from pypdf import PdfReader
+    return PdfReader(io.BytesIO(content))
+
+def _page_texts(reader, indices: Sequence[int]) -> List[str]:
+    return [reader.pages[i].extract_text() or "" for i in indices]
+
+def extract_pages(path: str, document_id: str, indices: Sequence[int]) -> List[str]:
+    """
+    Text of the given pages. Runs in a worker process: the file at `path` is
+    parsed on the first call for `document_id` and reused for later waves.
+    """
+    global _worker_document
+    if _worker_document[0] != document_id:
+        with open(path, "rb") as f:
+            _worker_document = (document_id, _reader(f.read()))
+    return _page_texts(_worker_document[1], indices)
+
+def _write_temp(content: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(content)
+        return f.name
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pool
+
+async def _collect(
+    count: int, budget_chars: int, extract: Callable[[List[int]], Awaitable[List[str]]], wave: int
+) -> str:
+    """
+    Extracts pages `wave` at a time from the start until 3/4 of `budget_chars`
+    is filled, then from the end for the rest. Returns the pages joined, with
+    a marker where pages were skipped.
+    """
+    head_goal = budget_chars * 3 // 4
+    head: List[str] = []
+    size, start = 0, 0
+    while start < count and size < head_goal:
+        indices = list(range(start, min(count, start + wave)))
+        for text in await extract(indices):
+            if size >= head_goal:
+                break
+            head.append(text)
+            size += len(text)
+            start += 1
+
+    tail: List[str] = []
+    size, end = 0, count
+    while end > start and size < budget_chars - head_goal:
+        indices = list(range(max(start, end - wave), end))[::-1]
+        for text in await extract(indices):
+            if size >= budget_chars - head_goal:
+                break
+            tail.insert(0, text)
+            size += len(text)
+            end -= 1
+
+    skipped = f"\n[... pages {start + 1}-{end} not extracted ...]\n" if end > start else ""
+    return "\n".join(head) + skipped + "\n".join(tail)
+
+async def extract_text(content: bytes, budget_chars: int) -> str:
+    """Text of the PDF in `content`, extracting only what `budget_chars` can hold."""
+    # Only the xref and page tree are read here; page content is decoded on extract
+    reader = await asyncio.to_thread(_reader, content)
+    count = len(reader.pages)
+
+    if count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+        async def extract(indices: List[int]) -> List[str]:
+            return await asyncio.to_thread(_page_texts, reader, indices)
+        return await _collect(count, budget_chars, extract, PAGES_PER_TASK)
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    path = await asyncio.to_thread(_write_temp, content)
+    document_id = uuid.uuid4().hex
+
+    async def extract(indices: List[int]) -> List[str]:
+        # One contiguous range of PAGES_PER_TASK pages per worker
+        chunks = [indices[i:i + PAGES_PER_TASK] for i in range(0, len(indices), PAGES_PER_TASK)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, extract_pages, path, document_id, chunk) for chunk in chunks
+        ])
+        return [text for chunk in results for text in chunk]
+    try:
+        return await _collect(count, budget_chars, extract, PDF_WORKERS * PAGES_PER_TASK)
+    finally:
+        os.unlink(path)
+
+async def document_text(content: bytes, budget_tokens: int = AI_DOCUMENT_TOKENS) -> str:
+    """
+    Prompt-ready text of a PDF within `budget_tokens` (see fit_text).
+    Cached by file hash, so the same document is only extracted once.
+    """
+    key = f"pdf_text:{hashlib.blake2b(content, digest_size=16).hexdigest()}:{budget_tokens}"
+    cached = await cache_service.get_persistent(key)
+    if cached is not None:
+        return cached
+    text = fit_text(await extract_text(content, budget_tokens * CHARS_PER_TOKEN), budget_tokens)
+    await cache_service.set_persistent(key, text, PDF_TEXT_CACHE_TTL)
+    return text
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
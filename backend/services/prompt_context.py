@@ -0,0 +1,134 @@
+import os
+import re
+import math
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from ..responses import dumps
+
+# Prompt data is sent compact and within a token budget: small tables go in
+# as rows, larger ones as statistics (totals, top-k, first->last change).
+AI_CONTEXT_TOKENS = int(os.getenv("AI_CONTEXT_TOKENS", 1500))
+AI_DOCUMENT_TOKENS = int(os.getenv("AI_DOCUMENT_TOKENS", 3000))
+
+# Roughly how BPE tokenizers split text: long words into ~4 character pieces,
+# each punctuation mark on its own
+TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+TIME_COLUMNS = ("date", "day", "week", "month", "quarter", "year", "period", "time")
+TOP_K_STEPS = (10, 5, 3, 1)
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate (no API call); within ~15% of Gemini's count for English and JSON."""
+    return len(TOKEN_RE.findall(text))
+
+def render(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+def _round(value: float) -> Any:
+    if math.isnan(value) or math.isinf(value):
+        return None
+    rounded = float(f"{value:.6g}")
+    return int(rounded) if rounded.is_integer() else rounded
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(row, dict) for row in value)
+
+def summarize_table(rows: List[Dict[str, Any]], top_k: int = 5) -> Dict[str, Any]:
+    """
+    Statistics for a list of row dicts: per numeric column total/min/max/mean,
+    the top `top_k` rows by the first numeric column (with their share), and
+    for rows ordered by a date-like column the first -> last change.
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    numeric = [c for c in columns if any(_is_number(row.get(c)) for row in rows)
+               and all(row.get(c) is None or _is_number(row.get(c)) for row in rows)]
+    labels = [c for c in columns if c not in numeric]
+    summary: Dict[str, Any] = {"rows": len(rows), "columns": columns}
+
+    stats = {}
+    for column in numeric:
+        values = [float(row[column]) for row in rows if row.get(column) is not None]
+        if values:
+            stats[column] = {
+                "total": _round(sum(values)), "min": _round(min(values)),
+                "max": _round(max(values)), "mean": _round(sum(values) / len(values)),
+            }
+    summary["stats"] = stats
+    if not numeric:
+        summary["sample"] = rows[:top_k]
+        return summary
+
+    measure = numeric[0]
+    time_column = next((c for c in labels if c.lower() in TIME_COLUMNS or c.lower().endswith(("_date", "_at"))), None)
+    if time_column is not None:
+        ordered = sorted((row for row in rows if row.get(time_column) is not None), key=lambda row: str(row[time_column]))
+        if len(ordered) >= 2:
+            first, last = ordered[0], ordered[-1]
+            start, end = float(first.get(measure) or 0), float(last.get(measure) or 0)
+            summary["change"] = {
+                "column": measure,
+                "from": {time_column: first[time_column], measure: _round(start)},
+                "to": {time_column: last[time_column], measure: _round(end)},
+                "delta": _round(end - start),
+                "pct": _round((end - start) / abs(start) * 100) if start else None,
+            }
+
+    total = stats.get(measure, {}).get("total") or 0
+    ranked = sorted(rows, key=lambda row: float(row.get(measure) or 0), reverse=True)
+    top = []
+    for row in ranked[:top_k]:
+        entry = {c: row.get(c) for c in labels[:2]}
+        entry[measure] = _round(float(row[measure])) if _is_number(row.get(measure)) else row.get(measure)
+        if total:
+            entry["share_pct"] = _round(float(row.get(measure) or 0) / total * 100)
+        top.append(entry)
+    summary[f"top_by_{measure}"] = top
+    return summary
+
+def fit_text(text: str, budget: int = AI_DOCUMENT_TOKENS) -> str:
+    """
+    `text` with whitespace collapsed, cut to about `budget` tokens: the start
+    and the end are kept (3:1), with a marker where the middle was dropped.
+    """
+    text = re.sub(r"[ \t]+", " ", re.sub(r"\n\s*\n+", "\n\n", text)).strip()
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    chars_per_token = len(text) / tokens
+    keep = int(budget * chars_per_token)
+    head, tail = text[: keep * 3 // 4], text[len(text) - keep // 4:]
+    omitted = tokens - estimate_tokens(head) - estimate_tokens(tail)
+    return f"{head}\n[... about {omitted} tokens omitted ...]\n{tail}"
+
+def _compress(value: Any, top_k: int) -> Any:
+    if _is_table(value):
+        if len(value) > top_k:
+            return summarize_table(value, top_k)
+        return [_compress(row, top_k) for row in value]
+    if isinstance(value, dict):
+        return {k: _compress(v, top_k) for k, v in value.items()}
+    if isinstance(value, list) and len(value) > top_k * 4:
+        return value[: top_k * 4] + [f"... {len(value) - top_k * 4} more"]
+    if isinstance(value, (float, Decimal)):
+        return _round(float(value))
+    return value
+
+def fit_context(value: Any, budget: int = AI_CONTEXT_TOKENS) -> str:
+    """
+    Compact JSON of `value` within about `budget` tokens. Tables (lists of row
+    dicts), wherever they are nested, are replaced by summarize_table output
+    with fewer top rows until it fits; as a last resort the text is cut.
+    """
+    if isinstance(value, str):
+        return fit_text(value, budget)
+    text = render(_compress(value, math.inf))
+    if estimate_tokens(text) <= budget:
+        return text
+    for top_k in TOP_K_STEPS:
+        text = render(_compress(value, top_k))
+        if estimate_tokens(text) <= budget:
+            return text
+    return fit_text(text, budget)
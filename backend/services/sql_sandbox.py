@@ -0,0 +1,99 @@
+import os
+import re
+import json
+import asyncio
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from .. import database
+from ..responses import dumps
+
+# Limits for model-generated chat SQL
+CHAT_SQL_MAX_ROWS = int(os.getenv("CHAT_SQL_MAX_ROWS", 500))
+CHAT_SQL_MAX_BYTES = int(os.getenv("CHAT_SQL_MAX_BYTES", 1_000_000))
+CHAT_SQL_MAX_COST = float(os.getenv("CHAT_SQL_MAX_COST", 1_000_000))  # Planner cost units
+CHAT_SQL_FETCH_SIZE = 100
+
+class QueryRejected(Exception):
+    """Raised when a chat query isn't run (or is stopped); the message is safe to show users."""
+
+def is_single_select(sql: str) -> bool:
+    """A single read-only statement."""
+    stripped = sql.strip().rstrip(";").strip()
+    return bool(re.match(r"(?is)^(select|with)\b", stripped)) and ";" not in stripped
+
+def bounded_sql(sql: str, max_rows: int) -> str:
+    """Wraps `sql` in an outer LIMIT, whatever LIMIT the inner query has (or lacks)."""
+    inner = sql.strip().rstrip(";").strip()
+    return f"SELECT * FROM ({inner}) AS chat_query LIMIT {int(max_rows)}"
+
+def plan_cost(explain_output: Any) -> float:
+    """Total Cost of the top plan node from EXPLAIN (FORMAT JSON) output."""
+    plan = json.loads(explain_output) if isinstance(explain_output, str) else explain_output
+    return float(plan[0]["Plan"]["Total Cost"])
+
+async def run_chat_query(
+    sql: str,
+    params: Dict[str, Any] = None,
+    max_rows: int = CHAT_SQL_MAX_ROWS,
+    max_bytes: int = CHAT_SQL_MAX_BYTES,
+    max_cost: float = CHAT_SQL_MAX_COST,
+) -> Dict[str, Any]:
+    """
+    Runs model-generated SQL on the read-only pool (database.readonly_engine).
+
+    Rejects anything but a single SELECT/WITH, and (on Postgres) queries whose
+    estimated plan cost exceeds `max_cost`. The transaction is read-only with
+    a statement_timeout. Rows are fetched in batches from a server-side cursor
+    under an outer LIMIT, stopping at `max_rows` rows or `max_bytes` of JSON.
+    Returns {"rows": [...], "truncated": bool}.
+    """
+    if not is_single_select(sql):
+        raise QueryRejected("Only single read-only SELECT queries can be run.")
+
+    engine = database.readonly_engine
+    is_postgres = engine.dialect.name == "postgresql"
+    query = bounded_sql(sql, max_rows + 1)  # One extra row tells us the result was cut
+    timeout = database.CHAT_SQL_TIMEOUT_MS / 1000
+
+    async def execute() -> Dict[str, Any]:
+        rows: List[Dict[str, Any]] = []
+        size = 0
+        truncated = False
+        # Never committed: closing the connection rolls the transaction back
+        async with engine.connect() as conn:
+            if is_postgres:
+                # Also set on asyncpg connections; repeated here for other drivers / URLs
+                await conn.execute(text("SET TRANSACTION READ ONLY"))
+                await conn.execute(text(f"SET LOCAL statement_timeout = {int(database.CHAT_SQL_TIMEOUT_MS)}"))
+                explain = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params or {})
+                cost = plan_cost(explain.scalar())
+                if cost > max_cost:
+                    raise QueryRejected(
+                        f"That question needs a query too expensive to run here (estimated cost {cost:,.0f}). "
+                        "Try narrowing it down, e.g. to a date range or category."
+                    )
+
+            result = await conn.stream(text(query).execution_options(yield_per=CHAT_SQL_FETCH_SIZE), params or {})
+            async for row in result.mappings():
+                row = dict(row)
+                size += len(dumps(row))
+                if len(rows) >= max_rows or size > max_bytes:
+                    truncated = True
+                    break
+                rows.append(row)
+            await result.close()
+        return {"rows": rows, "truncated": truncated}
+
+    try:
+        # Client-side guard too, for drivers/databases without statement_timeout
+        return await asyncio.wait_for(execute(), timeout=timeout + 1)
+    except asyncio.TimeoutError:
+        raise QueryRejected("That query took too long to run. Try a narrower question.")
+    except QueryRejected:
+        raise
+    except Exception as e:
+        if "statement timeout" in str(e) or "canceling statement" in str(e):
+            raise QueryRejected("That query took too long to run. Try a narrower question.")
+        raise
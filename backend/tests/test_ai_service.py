@@ -0,0 +1,114 @@
+import pytest
+from backend.services.ai_service import parse_batch_explanations
+
+def test_parse_batch_explanations_maps_charts_and_skips_gaps():
+    text = '```json\n{"explanations": [{"chart": 2, "explanation": " Second "}, {"chart": 1, "explanation": "First"}, {"chart": 3}]}\n```'
+    assert parse_batch_explanations(text) == {1: "First", 2: "Second"}
+    # A bare list is read in order
+    assert parse_batch_explanations('[{"explanation": "a"}, {"explanation": "b"}]') == {1: "a", 2: "b"}
+
+def test_snapshot_hash_changes_only_with_the_kpis():
+    from backend.services.insight_precompute import snapshot_hash
+    snapshot = {"total_revenue": 1234.5, "active_orders": 10, "revenue_by_category": [{"category": "A", "revenue": 1234.5}]}
+    reordered = {"active_orders": 10, "revenue_by_category": [{"revenue": 1234.5, "category": "A"}], "total_revenue": 1234.5}
+    assert snapshot_hash(snapshot) == snapshot_hash(reordered)
+    assert snapshot_hash(snapshot) != snapshot_hash({**snapshot, "active_orders": 11})
+    # Changes below the AI cache precision still count: a sync of a few orders
+    large = {**snapshot, "total_revenue": 1234567.89, "active_orders": 10000}
+    assert snapshot_hash(large) != snapshot_hash({**large, "total_revenue": 1234899.10})
+    assert snapshot_hash(large) != snapshot_hash({**large, "active_orders": 10004})
+
+def test_ai_cache_key_ignores_formatting_and_noise():
+    from backend.services.ai_service import normalize_content, ai_cache_key
+    assert normalize_content({"b": " two\n words ", "a": [1.23456789, 2.0, True, None]}) == {"a": [1.235, 2, True, None], "b": "two words"}
+    key = ai_cache_key("explain", {"title": "Revenue  trend", "data": [{"revenue": 1000.04, "month": "2024-01"}]})
+    assert key == ai_cache_key("explain", {"data": [{"month": "2024-01", "revenue": 1000.0}], "title": "Revenue trend"})
+    assert key != ai_cache_key("explain", {"title": "Revenue trend", "data": [{"revenue": 1100, "month": "2024-01"}]})
+    assert key != ai_cache_key("insight", {"title": "Revenue trend", "data": [{"revenue": 1000, "month": "2024-01"}]})
+
+@pytest.mark.asyncio
+async def test_cached_generation_skips_failures_and_waits_out_model_calls(monkeypatch):
+    from backend.services import ai_service
+    from backend.services.cache_backends import MemoryBackend
+    from backend.services.cache_service import CacheService
+
+    class LockRecordingBackend(MemoryBackend):
+        async def acquire_lock(self, key, timeout):
+            self.lock_timeout = timeout
+            return await super().acquire_lock(key, timeout)
+
+    backend = LockRecordingBackend()
+    monkeypatch.setattr(ai_service, "cache_service", CacheService(backend=backend))
+    results = [None, "Revenue is up.", "Different answer"]
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return results[len(calls) - 1]
+
+    # A failed generation (None) is not stored, so the next request tries again
+    assert await ai_service.cached_generation("explain", {"chart": 1}, generate) is None
+    assert await ai_service.cached_generation("explain", {"chart": 1}, generate) == "Revenue is up."
+    assert await ai_service.cached_generation("explain", {"chart": 1}, generate) == "Revenue is up."
+    await ai_service.cache_service.clear()  # An upload: the same content keeps its answer
+    assert await ai_service.cached_generation("explain", {"chart": 1}, generate) == "Revenue is up."
+    assert len(calls) == 2
+    # Other workers keep waiting for as long as a model call may take
+    assert backend.lock_timeout >= ai_service.AI_CALL_TIMEOUT
+
+@pytest.mark.asyncio
+async def test_insights_feed_excludes_executive_summaries(client, test_db):
+    from backend import models
+    test_db.add(models.AIInsight(type="EXECUTIVE_SUMMARY", title="Executive Summary (This Month)", content="## Summary"))
+    test_db.add(models.AIInsight(type="TREND", title="Revenue up", content="Revenue grew."))
+    await test_db.commit()
+    response = await client.get("/api/ai/insights")
+    assert response.status_code == 200
+    types = [insight["type"] for insight in response.json()]
+    assert "TREND" in types and "EXECUTIVE_SUMMARY" not in types
+
+@pytest.mark.asyncio
+async def test_precompute_runs_once_across_workers(test_db, monkeypatch):
+    import asyncio
+    from sqlalchemy import delete, func, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from backend import database, models
+    from backend.services import ai_service, insight_precompute
+    from backend.services.cache_backends import MemoryBackend
+    from backend.services.cache_service import CacheService
+
+    class SharedLockBackend(MemoryBackend):
+        """A Redis-like lock: only one holder at a time."""
+        holder = None
+
+        async def acquire_lock(self, key, timeout):
+            if self.holder is not None:
+                return None
+            self.holder = "token"
+            return self.holder
+
+        async def release_lock(self, key, token):
+            self.holder = None
+
+    monkeypatch.setattr(insight_precompute, "cache_service", CacheService(backend=SharedLockBackend()))
+    monkeypatch.setattr(insight_precompute, "PRECOMPUTE_LOCK_POLL", 0.01)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(test_db.bind, expire_on_commit=False))
+    calls = []
+
+    async def model(context, prompt_override=None):
+        calls.append(prompt_override is not None)
+        await asyncio.sleep(0.05)
+        if prompt_override:
+            return "## Summary"
+        return '{"title": "Revenue", "type": "TREND", "content": "Up.", "confidence_score": 0.9}'
+
+    monkeypatch.setattr(ai_service, "generate_business_insight", model)
+    await test_db.execute(delete(models.AIInsight))
+    await test_db.commit()
+
+    # Two workers starting up together: the second waits, then finds both texts stored
+    results = await asyncio.gather(insight_precompute.precompute(), insight_precompute.precompute())
+    assert sorted(len(r["generated"]) for r in results) == [0, 2]
+    assert len(calls) == 2
+    count = await test_db.scalar(select(func.count()).select_from(models.AIInsight))
+    assert count == 2
@@ -0,0 +1,29 @@
+import asyncio
+import pytest
+from backend.services.background import CoalescingJob
+
+@pytest.mark.asyncio
+async def test_coalescing_job_folds_triggers_into_one_follow_up_pass():
+    runs = []
+    release = asyncio.Event()
+
+    async def job():
+        runs.append(len(runs))
+        if len(runs) == 1:
+            await release.wait()
+        return len(runs)
+
+    background = CoalescingJob("Test job", job)
+    task = background.schedule("startup")
+    await asyncio.sleep(0)
+    # Triggers during the first pass share a single follow-up pass
+    assert background.schedule("upload") is task
+    assert background.schedule("sync") is task
+    release.set()
+    await task
+    assert runs == [0, 1]
+
+    background.schedule("upload")
+    background.stop()
+    await asyncio.sleep(0)
+    assert runs == [0, 1]
@@ -0,0 +1,297 @@
+import asyncio
+import time
+import pytest
+from backend.services.cache_backends import MemoryBackend
+from backend.services.cache_service import CacheService
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set_nowait("a", 1)
+    backend.set_nowait("b", 2)
+    assert backend.get_nowait("a") == 1  # "a" is now most recently used
+    backend.set_nowait("c", 3)
+
+    assert backend.get_nowait("b") is None
+    assert backend.get_nowait("a") == 1
+    assert backend.evictions == 1
+
+def test_memory_backend_respects_byte_budget():
+    backend = MemoryBackend(max_entries=100, max_bytes=50)
+    backend.set_nowait("a", "x" * 20)
+    backend.set_nowait("b", "y" * 20)
+    backend.set_nowait("c", "z" * 20)
+
+    assert backend.current_bytes <= 50
+    assert backend.get_nowait("a") is None
+    assert backend.get_nowait("c") == "z" * 20
+
+def test_memory_backend_sweep_drops_expired():
+    backend = MemoryBackend()
+    backend.set_nowait("old", 1, ttl=60)
+    backend.set_nowait("new", 2, ttl=60)
+    value, _, size = backend._store["old"]
+    backend._store["old"] = (value, time.time() - 1, size)
+
+    assert backend.sweep() == 1
+    assert len(backend) == 1
+    assert backend.expirations == 1
+
+@pytest.mark.asyncio
+async def test_cache_service_memory_mode_roundtrip():
+    service = CacheService(backend=MemoryBackend())
+    await service.set("kpi_overview:x", {"total_revenue": 10.0}, ttl=60)
+
+    assert await service.get("kpi_overview:x") == {"total_revenue": 10.0}
+    assert await service.get("missing") is None
+    assert service.stats()["hits"] == 1
+    assert service.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_clear_by_prefix_only_invalidates_that_namespace():
+    backend = MemoryBackend()
+    service = CacheService(backend=backend)
+    await service.set("rev_trend:a", 1)
+    await service.set("kpi_overview:a", 2)
+
+    await service.clear("rev_trend:*")
+    assert await service.get("rev_trend:a") is None
+    assert await service.get("kpi_overview:a") == 2
+    await asyncio.gather(*service._cleanups)
+    assert len(backend) == 1  # old rev_trend entry physically removed
+
+    await service.clear()
+    assert await service.get("kpi_overview:a") is None
+
+def test_tiered_backend_applies_remote_invalidations():
+    pytest.importorskip("redis")
+    from backend.services.cache_backends import RedisBackend, TieredBackend
+    import json
+
+    tiered = TieredBackend(MemoryBackend(), RedisBackend("redis://localhost:6379"))
+    tiered.l1.set_nowait("kpi_overview:a", 1)
+    tiered.l1.set_nowait("rev_trend:b", 2)
+
+    # Own messages are ignored, other workers' are applied
+    tiered.handle_invalidation(json.dumps({"origin": tiered.instance_id, "keys": ["kpi_overview:a"]}))
+    assert tiered.l1.get_nowait("kpi_overview:a") == 1
+
+    tiered.handle_invalidation(json.dumps({"origin": "other-worker", "keys": ["kpi_overview:a"]}))
+    assert tiered.l1.get_nowait("kpi_overview:a") is None
+
+    tiered.handle_invalidation(json.dumps({"origin": "other-worker", "pattern": "*"}))
+    assert len(tiered.l1) == 0
+
+@pytest.mark.asyncio
+async def test_get_or_compute_coalesces_concurrent_misses():
+    import asyncio
+    service = CacheService(backend=MemoryBackend())
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"total_revenue": 1.0}
+
+    results = await asyncio.gather(*[service.get_or_compute("kpi_overview:x", compute, ttl=60) for _ in range(10)])
+
+    assert calls == 1
+    assert all(r == {"total_revenue": 1.0} for r in results)
+    assert service.coalesced == 9
+
+@pytest.mark.asyncio
+async def test_get_or_compute_serves_stale_while_revalidating():
+    import asyncio
+    service = CacheService(backend=MemoryBackend())
+    version = 0
+
+    async def compute():
+        nonlocal version
+        version += 1
+        return version
+
+    assert await service.get_or_compute("rev_trend:x", compute, ttl=60, stale_ttl=60, beta=0) == 1
+
+    # Push the entry past its soft expiry: the stale value comes back at once
+    envelope = await service.get("rev_trend:x")
+    envelope["fresh_until"] = time.time() - 1
+    assert await service.get_or_compute("rev_trend:x", compute, ttl=60, stale_ttl=60, beta=0) == 1
+    assert service.stale_served == 1
+
+    await asyncio.sleep(0.01)  # let the background refresh finish
+    assert await service.get_or_compute("rev_trend:x", compute, ttl=60, stale_ttl=60, beta=0) == 2
+
+def test_build_cache_key_is_canonical_and_compact():
+    from datetime import datetime
+    from backend.services.cache_service import build_cache_key
+
+    a = build_cache_key("kpi_overview", "get_kpi_overview", {"days": 30, "min_order_value": 100.0, "region": None})
+    b = build_cache_key("kpi_overview", "get_kpi_overview", {"region": None, "min_order_value": 100, "days": 30})
+    assert a == b
+    assert len(a) < 64
+
+    # Non-keyable values (ORM objects, sessions) are left out rather than breaking the key
+    c = build_cache_key("kpi_overview", "get_kpi_overview", {"days": 30, "min_order_value": 100, "region": None, "user": object()})
+    assert c == a
+
+    # Datetimes in the same granularity window share a key
+    early = build_cache_key("p", "f", {"since": datetime(2024, 1, 1, 10, 0, 5)}, granularity=60)
+    late = build_cache_key("p", "f", {"since": datetime(2024, 1, 1, 10, 0, 55)}, granularity=60)
+    assert early == late
+
+@pytest.mark.asyncio
+async def test_cache_decorator_varies_on_declared_dependency(monkeypatch):
+    from types import SimpleNamespace
+    from backend.services import cache_service as cache_module
+
+    monkeypatch.setattr(cache_module, "cache_service", CacheService(backend=MemoryBackend()))
+    calls = []
+
+    @cache_module.cache(ttl=60, key_prefix="test", vary_on={"user": lambda u: u.role})
+    async def endpoint(days: int = 30, user=None):
+        calls.append(user.role)
+        return {"role": user.role}
+
+    admin, viewer = SimpleNamespace(role="ADMIN"), SimpleNamespace(role="VIEWER")
+    assert await endpoint(days=30, user=admin) == {"role": "ADMIN"}
+    assert await endpoint(days=30, user=viewer) == {"role": "VIEWER"}
+    assert await endpoint(days=30.0, user=SimpleNamespace(role="ADMIN")) == {"role": "ADMIN"}
+    assert calls == ["ADMIN", "VIEWER"]
+
+@pytest.mark.asyncio
+async def test_cache_decorator_computes_with_its_own_session(monkeypatch):
+    from backend import database
+    from backend.services import cache_service as cache_module
+
+    monkeypatch.setattr(cache_module, "cache_service", CacheService(backend=MemoryBackend()))
+    opened = []
+
+    class OwnSession:
+        async def __aenter__(self):
+            opened.append(self)
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(database, "AsyncSessionLocal", OwnSession)
+    release = asyncio.Event()
+
+    @cache_module.cache(ttl=60, key_prefix="test")
+    async def endpoint(days: int = 30, db=None):
+        await release.wait()
+        return {"session": "own" if db in opened else "request"}
+
+    # The first caller goes away mid-fill; the waiter still gets the shared result
+    first = asyncio.ensure_future(endpoint(days=7, db="request-session"))
+    second = asyncio.ensure_future(endpoint(days=7, db="request-session"))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == {"session": "own"}
+    assert len(opened) == 1
+
+def test_cache_codec_roundtrip_and_legacy_entries():
+    from backend.services.cache_codecs import CacheCodec, SERIALIZERS, COMPRESSORS
+
+    value = {"preview": [{"id": i, "name": f"row {i}", "revenue": i * 1.5} for i in range(200)], "rows": 200}
+    for serializer in SERIALIZERS:
+        for compressor in COMPRESSORS:
+            codec = CacheCodec(serializer, compressor, compress_min_bytes=256)
+            data = codec.encode(value)
+            assert codec.decode(data) == value
+            if compressor != "none":
+                assert codec.bytes_encoded < codec.bytes_raw
+
+    # Small payloads skip compression; JSON text written before codecs still decodes
+    codec = CacheCodec("json", "zlib", compress_min_bytes=1024)
+    assert codec.encode({"a": 1})[1] == 0
+    assert codec.decode(b'{"a": 1}') == {"a": 1}
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_over_to_memory_and_replays_invalidations():
+    from backend.services.cache_backends import CircuitBreakerBackend
+
+    class FlakyBackend(MemoryBackend):
+        name = "redis"
+        down = False
+
+        async def get(self, key):
+            if self.down:
+                raise ConnectionError("redis down")
+            return await super().get(key)
+
+        async def set(self, key, value, ttl=60):
+            if self.down:
+                raise ConnectionError("redis down")
+            return await super().set(key, value, ttl)
+
+        async def clear(self, key_pattern=None, keep_prefix=None):
+            if self.down:
+                raise ConnectionError("redis down")
+            self.cleared.append(key_pattern)
+            await super().clear(key_pattern, keep_prefix)
+
+        async def ping(self):
+            return not self.down
+
+    primary = FlakyBackend()
+    primary.cleared = []
+    breaker = CircuitBreakerBackend(primary, MemoryBackend(), failure_threshold=2, overflow_pattern="kpi_*")
+    await breaker.set("kpi_overview:a", 1)
+    await primary.set("other_app:a", 1)
+
+    primary.down = True
+    assert await breaker.get("kpi_overview:a") is None
+    await breaker.set("kpi_overview:a", 2)
+    assert breaker.is_open and breaker.mode == "memory"
+    assert await breaker.get("kpi_overview:a") == 2  # served by the memory tier
+
+    await breaker.clear()  # e.g. an upload during the outage
+    primary.down = False
+    assert await breaker.probe()
+
+    assert not breaker.is_open
+    assert await breaker.get("kpi_overview:a") is None  # stale Redis entry was cleared on recovery
+    # Replayed within the namespace only, never as a whole-database "*"
+    assert primary.cleared == ["kpi_*"] and await primary.get("other_app:a") == 1
+
+@pytest.mark.asyncio
+async def test_cache_metrics_track_per_prefix_results():
+    service = CacheService(backend=MemoryBackend(max_entries=1))
+
+    async def compute():
+        return [1, 2, 3]
+
+    await service.get_or_compute("rev_trend:a", compute, ttl=60)
+    await service.get_or_compute("rev_trend:a", compute, ttl=60)
+    await service.get_or_compute("kpi_overview:a", compute, ttl=60)  # evicts rev_trend:a
+
+    prefixes = service.metrics.snapshot()["prefixes"]
+    assert prefixes["rev_trend"]["miss"] == 1 and prefixes["rev_trend"]["hit"] == 1
+    assert prefixes["rev_trend"]["evictions"] == 1
+    assert prefixes["kpi_overview"]["payload_bytes"]["count"] == 1
+    assert prefixes["kpi_overview"]["payload_bytes"]["sum"] > len("[1,2,3]")  # Stored envelope, sized by the backend
+    assert 'cache_requests_total{prefix="rev_trend",result="hit"} 1' in service.metrics.prometheus()
+
+@pytest.mark.asyncio
+async def test_unencodable_values_are_skipped_without_tripping_the_breaker():
+    from datetime import datetime
+    from backend.services.cache_backends import CircuitBreakerBackend, RedisBackend
+    from backend.services.cache_codecs import CacheCodec
+
+    # Rejected before any network call
+    redis_backend = RedisBackend("redis://localhost:1", codec=CacheCodec("json", "none"))
+    assert await redis_backend.set("kpi_overview:a", {"at": datetime(2024, 1, 1)}) is None
+    assert redis_backend.unencodable == 1 and redis_backend.errors == 0
+
+    class BadValueBackend(MemoryBackend):
+        name = "redis"
+
+        async def set(self, key, value, ttl=60):
+            raise TypeError("Object of type Decimal is not JSON serializable")
+
+    breaker = CircuitBreakerBackend(BadValueBackend(), MemoryBackend(), failure_threshold=2, overflow_pattern="kpi_*")
+    for _ in range(5):
+        await breaker.set("kpi_overview:a", 1)
+    assert not breaker.is_open and breaker.consecutive_failures == 0
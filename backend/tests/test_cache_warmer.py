@@ -0,0 +1,14 @@
+from fastapi import Depends
+from backend.services.cache_warmer import view_filters, endpoint_params
+
+def test_cache_warmer_maps_saved_views_to_endpoint_params():
+    filters = view_filters('{"category": "Home", "region": "", "dateRange": "90d"}')
+    assert filters == {"category": "Home", "region": None, "days": 90}
+    assert view_filters('{"dateRange": "all"}')["days"] == 0
+    assert view_filters("not json") is None
+
+    async def endpoint(days: int = 30, category: str = None, min_order_value: float = None, db=None, user=Depends(lambda: None)):
+        pass
+
+    # Defaults are filled in the way FastAPI passes them, so the cache key matches
+    assert endpoint_params(endpoint, filters) == {"days": 90, "category": "Home", "min_order_value": None}
@@ -0,0 +1,22 @@
+from backend.services.chat_intents import parse_intent
+
+VOCABULARY = {"category": ["Electronics"], "region": ["North America", "Europe"]}
+
+def test_parse_intent_reads_kpi_questions():
+    assert parse_intent("What is our total revenue?", VOCABULARY) == {
+        "metric": "revenue", "group": None, "category": None, "region": None, "days": 0,
+    }
+    intent = parse_intent("Revenue by region in Electronics for the last 2 weeks", VOCABULARY)
+    assert (intent["group"], intent["category"], intent["days"]) == ("region", "Electronics", 14)
+    intent = parse_intent("What's the average order value over the past 3 months", VOCABULARY)
+    assert (intent["metric"], intent["days"]) == ("aov", 90)
+
+def test_parse_intent_leaves_other_questions_to_the_model():
+    for question in [
+        "Top 5 products by revenue",            # Unknown words and numbers
+        "revenue from returning customers",     # Two metrics
+        "Compare Europe and North America revenue",
+        "how many customers in Europe",         # count_customers can't filter by region
+        "revenue by category last 30 days",     # Revenue by category has no date filter
+    ]:
+        assert parse_intent(question, VOCABULARY) is None, question
@@ -0,0 +1,90 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import delete
+from backend import models
+from backend.services import cohort_service
+
+@pytest.mark.asyncio
+async def test_cohort_matrix_is_maintained_incrementally(test_db):
+    for i in (1, 2):
+        test_db.add(models.Customer(id=i, name=f"C{i}", email=f"c{i}@test.com", region="EU"))
+    await test_db.commit()
+
+    await cohort_service.record_orders(test_db, [(1, datetime(2024, 1, 5)), (1, datetime(2024, 2, 9)), (2, datetime(2024, 2, 1))])
+    await test_db.commit()
+    cohorts = await cohort_service.get_cohort_analysis(test_db)
+    assert [(c["cohort"], c["size"]) for c in cohorts] == [("2024-01", 1), ("2024-02", 1)]
+    assert [p["month_index"] for p in cohorts[0]["retention"]] == [0, 1]
+
+    # A backfilled earlier order moves customer 2 (and their active months) to the January cohort
+    await cohort_service.record_orders(test_db, [(2, datetime(2024, 1, 20)), (2, datetime(2024, 3, 3))])
+    await test_db.commit()
+    cohorts = await cohort_service.get_cohort_analysis(test_db)
+    assert len(cohorts) == 1 and cohorts[0]["size"] == 2
+    assert [(p["month_index"], p["active_customers"], p["percentage"]) for p in cohorts[0]["retention"]] == [
+        (0, 2, 100.0), (1, 2, 100.0), (2, 1, 50.0),
+    ]
+
+@pytest.mark.asyncio
+async def test_cohort_engine_granularities_and_revenue(test_db):
+    from backend.services import cohort_engine
+    # The test database is shared: start from an empty order history
+    await test_db.execute(delete(models.OrderItem))
+    await test_db.execute(delete(models.Order))
+    for i in (11, 12):
+        test_db.add(models.Customer(id=i, name=f"C{i}", email=f"c{i}@test.com", region="EU"))
+    orders = [(11, datetime(2024, 1, 1), 100.0), (11, datetime(2024, 1, 9), 50.0), (11, datetime(2024, 4, 2), 25.0), (12, datetime(2024, 1, 3), 100.0)]
+    for customer_id, created_at, amount in orders:
+        test_db.add(models.Order(customer_id=customer_id, created_at=created_at, total_amount=amount))
+    await test_db.commit()
+    assert await cohort_service.rebuild(test_db) == 4
+
+    # Monthly customer retention agrees with the maintained matrix
+    points = lambda rows: [(r["cohort"], r["size"], [(p["month_index"], p["active_customers"], p["percentage"]) for p in r["retention"]]) for r in rows]
+    assert points(await cohort_engine.get_cohort_retention(test_db)) == points(await cohort_service.get_cohort_analysis(test_db))
+
+    weekly = await cohort_engine.get_cohort_retention(test_db, "week")
+    assert [(r["cohort"], r["size"]) for r in weekly] == [("2024-W01", 2)]
+    assert [(p["period_index"], p["active_customers"]) for p in weekly[0]["retention"]] == [(0, 2), (1, 1), (13, 1)]
+
+    quarterly = await cohort_engine.get_cohort_retention(test_db, "quarter", "revenue")
+    assert quarterly[0]["cohort"] == "2024-Q1"
+    assert [(p["period_index"], p["revenue"], p["percentage"]) for p in quarterly[0]["retention"]] == [(0, 250.0, 100.0), (1, 25.0, 10.0)]
+
+    await test_db.execute(delete(models.Order))
+    await cohort_service.rebuild(test_db)
+
+@pytest.mark.asyncio
+async def test_needs_rebuild_detects_stale_cohort_tables(test_db):
+    await test_db.execute(delete(models.OrderItem))
+    await test_db.execute(delete(models.Order))
+    await cohort_service.rebuild(test_db)
+    assert not await cohort_service.needs_rebuild(test_db)
+
+    test_db.add(models.Customer(id=21, name="C21", email="c21@test.com", region="EU"))
+    test_db.add(models.Order(customer_id=21, created_at=datetime(2024, 5, 1), total_amount=10.0))
+    await test_db.commit()
+    assert await cohort_service.needs_rebuild(test_db)  # Orders from before the tables existed
+    await cohort_service.rebuild(test_db)
+    assert not await cohort_service.needs_rebuild(test_db)
+
+    # TRUNCATE customers CASCADE: per-customer tables and orders go, the matrix stays
+    await test_db.execute(delete(models.Order))
+    await test_db.execute(delete(models.CustomerActiveMonth))
+    await test_db.execute(delete(models.CustomerFirstOrder))
+    await test_db.commit()
+    assert await cohort_service.needs_rebuild(test_db)
+    await cohort_service.rebuild(test_db)
+    assert not await cohort_service.needs_rebuild(test_db)
+
+@pytest.mark.asyncio
+async def test_cohort_writers_take_the_advisory_lock_on_postgres():
+    from types import SimpleNamespace
+    statements = []
+
+    async def execute(statement, params=None):
+        statements.append((str(statement), params))
+
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=SimpleNamespace(name="postgresql")), execute=execute)
+    await cohort_service.lock_for_write(db)
+    assert statements == [("SELECT pg_advisory_xact_lock(:id)", {"id": cohort_service.COHORT_WRITE_LOCK})]
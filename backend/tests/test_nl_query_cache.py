@@ -0,0 +1,14 @@
+from backend.services.nl_query_cache import extract_entities, templatize_sql
+
+def test_nl_query_templates_bind_question_entities():
+    vocabulary = {"category": ["Home"], "region": ["North America", "America"]}
+    key, entities = extract_entities("Top 5 products in home for North America?", vocabulary)
+    assert key == "top <num> products in <category> for <region>"
+    assert entities == [("num", 5), ("category", "Home"), ("region", "North America")]
+
+    sql = "SELECT name FROM products p WHERE p.category = 'Home' AND region = 'North America' LIMIT 5"
+    assert templatize_sql(sql, entities) == (
+        "SELECT name FROM products p WHERE p.category = :p1 AND region = :p2 LIMIT :p0"
+    )
+    # A value embedded in a string literal can't be swapped safely
+    assert templatize_sql("SELECT 1 WHERE d > now() - INTERVAL '30 days'", [("num", 30)]) is None
@@ -0,0 +1,40 @@
+import pytest
+from backend.services.pdf_extraction import _collect
+
+@pytest.mark.asyncio
+async def test_collect_extracts_only_pages_the_budget_can_hold():
+    pages = [f"page{i:03d}" + "x" * 93 for i in range(100)]  # 100 chars each
+    extracted = []
+
+    async def extract(indices):
+        extracted.extend(indices)
+        return [pages[i] for i in indices]
+
+    text = await _collect(len(pages), 1000, extract, wave=4)
+    assert text.startswith("page000") and text.rstrip().endswith("x")
+    assert "page007" in text and "page099" in text and "page050" not in text
+    assert "[... pages 9-97 not extracted ...]" in text
+    assert len(extracted) < 20
+
+    # A short document comes back whole, in order
+    text = await _collect(5, 100_000, extract, wave=4)
+    assert [line[:7] for line in text.split("\n")] == [f"page{i:03d}" for i in range(5)]
+
+def test_worker_parses_each_document_once():
+    import io, os
+    from pypdf import PdfWriter
+    from backend.services.pdf_extraction import extract_pages, _write_temp
+
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    path = _write_temp(buffer.getvalue())
+
+    assert extract_pages(path, "doc-1", [0, 1]) == ["", ""]
+    os.unlink(path)
+    # Later waves for the same document reuse the parsed reader
+    assert extract_pages(path, "doc-1", [2]) == [""]
+    with pytest.raises(FileNotFoundError):
+        extract_pages(path, "doc-2", [0])
@@ -0,0 +1,96 @@
+import json
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from backend import database, models
+
+@pytest_asyncio.fixture
+async def products(test_db):
+    # The test database is shared: start from an empty catalogue
+    await test_db.execute(delete(models.OrderItem))
+    await test_db.execute(delete(models.Product))
+    for i in range(5):
+        test_db.add(models.Product(
+            id=i + 1, name=f"P{i}", category="Tools" if i % 2 else "Toys", price=10.0 + i, cost=5.0,
+            stock_quantity=i * 5, sku=f"SKU-{i}", low_stock_threshold=10,
+        ))
+    await test_db.commit()
+    yield
+    await test_db.execute(delete(models.Product))
+    await test_db.commit()
+
+@pytest.mark.asyncio
+async def test_products_page_keyset_and_projection(client, products):
+    response = await client.get("/api/products/page", params={"limit": 2, "fields": "name,price"})
+    assert response.status_code == 200
+    page = response.json()
+    assert page == {"items": [{"id": 1, "name": "P0", "price": 10.0}, {"id": 2, "name": "P1", "price": 11.0}], "next_after_id": 2}
+
+    ids = [item["id"] for item in page["items"]]
+    while page["next_after_id"] is not None:
+        page = (await client.get("/api/products/page", params={"limit": 2, "after_id": page["next_after_id"]})).json()
+        ids += [item["id"] for item in page["items"]]
+    assert ids == [1, 2, 3, 4, 5]
+    assert page["items"][-1]["sku"] == "SKU-4"  # Last (partial) page, all columns
+
+    response = await client.get("/api/products/page", params={"fields": "name,margin"})
+    assert response.status_code == 400
+    assert "margin" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_products_page_filters(client, products):
+    page = (await client.get("/api/products/page", params={"category": "Tools", "fields": "name"})).json()
+    assert [item["name"] for item in page["items"]] == ["P1", "P3"]
+    assert page["next_after_id"] is None
+
+    page = (await client.get("/api/products/page", params={"low_stock": True, "fields": "stock_quantity"})).json()
+    assert [item["stock_quantity"] for item in page["items"]] == [0, 5, 10]
+
+@pytest.mark.asyncio
+async def test_products_stream_is_ndjson(client, products, test_db, monkeypatch):
+    # The stream opens its own session
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(test_db.bind, expire_on_commit=False))
+    response = await client.get("/api/products/stream", params={"fields": "sku", "category": "Toys"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert response.text.endswith("\n")
+    assert [json.loads(line) for line in lines] == [{"id": 1, "sku": "SKU-0"}, {"id": 3, "sku": "SKU-2"}, {"id": 5, "sku": "SKU-4"}]
+
+@pytest.mark.asyncio
+async def test_low_stock_is_most_depleted_first(client, products, test_db):
+    test_db.add(models.Product(id=6, name="P5", category="Toys", price=1.0, cost=0.5, stock_quantity=0, sku="SKU-5", low_stock_threshold=10))
+    await test_db.commit()
+    response = await client.get("/api/products/low-stock", params={"fields": "stock_quantity"})
+    assert response.status_code == 200
+    # Ties on stock_quantity fall back to id
+    assert [(p["id"], p["stock_quantity"]) for p in response.json()] == [(1, 0), (6, 0), (2, 5), (3, 10)]
+
+    response = await client.get("/api/products/low-stock", params={"category": "Tools", "limit": 1})
+    assert [p["name"] for p in response.json()] == ["P1"]
+
+@pytest.mark.asyncio
+async def test_bulk_stock_update_counts_and_duplicates(client, products, test_db):
+    response = await client.patch("/api/products/stock/bulk", json={"updates": [
+        {"sku": "SKU-0", "quantity": 7},
+        {"sku": "SKU-1", "quantity": 3},
+        {"sku": "SKU-0", "quantity": 40},  # Duplicate: the last quantity wins
+        {"sku": "MISSING", "quantity": 1},
+    ]})
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2, "not_found": ["MISSING"]}
+
+    page = (await client.get("/api/products/page", params={"fields": "sku,stock_quantity", "limit": 2})).json()
+    assert [(p["sku"], p["stock_quantity"]) for p in page["items"]] == [("SKU-0", 40), ("SKU-1", 3)]
+
+@pytest.mark.asyncio
+async def test_update_stock_returns_updated_row(client, products):
+    response = await client.patch("/api/products/2/stock", params={"quantity": 99})
+    assert response.status_code == 200
+    product = response.json()
+    assert (product["id"], product["sku"], product["stock_quantity"]) == (2, "SKU-1", 99)
+    assert "created_at" in product
+
+    response = await client.patch("/api/products/999/stock", params={"quantity": 1})
+    assert response.status_code == 404
@@ -0,0 +1,16 @@
+from backend.services.prompt_context import estimate_tokens, fit_context, fit_text
+
+def test_fit_context_summarizes_large_tables_within_budget():
+    rows = [{"category": f"Category {i}", "revenue": i * 100.0} for i in range(1, 201)]
+    text = fit_context({"chart": "Revenue by category", "data": rows}, budget=300)
+    assert estimate_tokens(text) <= 300
+    assert '"rows":200' in text and '"total":2010000' in text
+    assert '"category":"Category 200"' in text  # Top row kept
+
+    small = [{"date": "2024-01-01", "revenue": 1.23456789}]
+    assert fit_context(small) == '[{"date":"2024-01-01","revenue":1.23457}]'
+
+def test_fit_text_keeps_start_and_end():
+    text = fit_text("start " + "filler " * 5000 + "end", budget=200)
+    assert text.startswith("start") and text.endswith("end")
+    assert estimate_tokens(text) < 230
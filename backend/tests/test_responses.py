@@ -0,0 +1,22 @@
+import json
+from datetime import datetime
+from backend.responses import FastJSONResponse, iter_json_array
+
+def test_iter_json_array_matches_single_render():
+    rows = [{"id": i, "revenue": i * 1.5, "created_at": datetime(2024, 1, 1)} for i in range(25)]
+
+    streamed = b"".join(iter_json_array(rows, chunk_rows=10))
+    rendered = FastJSONResponse(rows).body
+
+    assert json.loads(streamed) == json.loads(rendered)
+    assert json.loads(streamed)[3]["created_at"].startswith("2024-01-01T00:00:00")
+
+def test_iter_json_array_empty():
+    assert b"".join(iter_json_array([])) == b"[]"
+
+def test_sse_event_is_single_line_json():
+    from backend.responses import sse_event
+
+    event = sse_event("token", {"text": "line one\nline two"})
+    assert event.startswith(b"event: token\ndata: ")
+    assert event.endswith(b"\n\n") and event.count(b"\n") == 3
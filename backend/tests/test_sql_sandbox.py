@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from backend import database, models
+from backend.services import sql_sandbox
+
+def test_sql_sandbox_accepts_single_selects_only():
+    assert sql_sandbox.is_single_select("WITH t AS (SELECT 1) SELECT * FROM t;")
+    assert not sql_sandbox.is_single_select("SELECT 1; DELETE FROM products")
+    assert not sql_sandbox.is_single_select("UPDATE products SET price = 0")
+    assert sql_sandbox.bounded_sql("SELECT * FROM products LIMIT 10000;", 5) == (
+        "SELECT * FROM (SELECT * FROM products LIMIT 10000) AS chat_query LIMIT 5"
+    )
+
+@pytest.mark.asyncio
+async def test_run_chat_query_caps_rows_and_rejects_writes(tmp_path, monkeypatch):
+    # A file database: the sandbox opens its own connections
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    monkeypatch.setattr(database, "readonly_engine", engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        for i in range(5):
+            session.add(models.Product(name=f"P{i}", category="X", price=i, cost=0, stock_quantity=1, sku=f"S{i}"))
+        await session.commit()
+
+    result = await sql_sandbox.run_chat_query("SELECT name FROM products ORDER BY price", max_rows=3)
+    assert [row["name"] for row in result["rows"]] == ["P0", "P1", "P2"]
+    assert result["truncated"]
+
+    result = await sql_sandbox.run_chat_query("SELECT name FROM products WHERE price = :p0", {"p0": 4})
+    assert result == {"rows": [{"name": "P4"}], "truncated": False}
+
+    with pytest.raises(sql_sandbox.QueryRejected):
+        await sql_sandbox.run_chat_query("DELETE FROM products")
+    await engine.dispose()
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import time
+import asyncio
+from collections import defaultdict
+
+import numpy as np
+
+from backend.services import cohort_engine, cohort_service
+
+# Cohort retention cost: the NumPy engine against a per-order Python loop on
+# synthetic orders, and with --db against the SQL paths on DATABASE_URL.
+# Usage: python scripts/bench_cohorts.py [orders] [--db]
+
+ORDERS = int(next((a for a in sys.argv[1:] if a.isdigit()), 1_000_000))
+
+def make_orders(n: int):
+    rng = np.random.default_rng(42)
+    customers = rng.integers(1, max(n // 8, 2), size=n, dtype=np.int64)
+    start = np.datetime64("2022-01-01T00:00:00", "s")
+    created = start + rng.integers(0, 3 * 365 * 86400, size=n).astype("timedelta64[s]")
+    amounts = rng.gamma(2.0, 40.0, size=n)
+    return customers, created, amounts
+
+def python_matrix(customers, periods):
+    """Reference: dict/set loops, as an ORM-side implementation would do it."""
+    first = {}
+    for customer, period in zip(customers.tolist(), periods.tolist()):
+        if period < first.get(customer, period + 1):
+            first[customer] = period
+    cells = defaultdict(set)
+    for customer, period in zip(customers.tolist(), periods.tolist()):
+        cells[(first[customer], period - first[customer])].add(customer)
+    return {cell: len(members) for cell, members in cells.items()}
+
+def matrix_cells(matrix):
+    return {
+        (int(cohort), int(offset)): int(matrix["active"][i][offset])
+        for i, cohort in enumerate(matrix["cohorts"])
+        for offset in np.flatnonzero(matrix["active"][i])
+    }
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<44} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+async def atimed(label: str, coro):
+    start = time.perf_counter()
+    result = await coro
+    print(f"  {label:<44} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+def bench_memory():
+    customers, created, amounts = make_orders(ORDERS)
+    print(f"\nSynthetic: {ORDERS:,} orders, {len(np.unique(customers)):,} customers")
+    for granularity in cohort_engine.GRANULARITIES:
+        periods = cohort_engine.period_numbers(created, granularity)
+        print(f" {granularity}:")
+        matrix = timed("numpy engine (customers + revenue)", lambda: cohort_engine.cohort_matrix(customers, periods, amounts))
+        reference = timed("python loop (customers only)", lambda: python_matrix(customers, periods))
+        assert matrix_cells(matrix) == reference, "engine and reference disagree"
+
+async def bench_db():
+    from backend.database import AsyncSessionLocal, engine
+    print(f"\nDatabase ({engine.dialect.name}):")
+    async with AsyncSessionLocal() as db:
+        matrix = await atimed("materialized matrix (get_cohort_analysis)", cohort_service.get_cohort_analysis(db))
+        arrays = await atimed("engine: load orders", cohort_engine.load_orders(db))
+        periods = cohort_engine.period_numbers(arrays[1], "month")
+        rows = cohort_engine.to_rows(timed("engine: compute", lambda: cohort_engine.cohort_matrix(arrays[0], periods, arrays[2])))
+        if engine.dialect.name == "postgresql":
+            sql = await atimed("SQL full scan (DATE_TRUNC / EXTRACT)", cohort_service.get_cohort_analysis_from_orders(db))
+            strip = lambda result: [(r["cohort"], r["size"], [(p["month_index"], p["active_customers"]) for p in r["retention"]]) for r in result]
+            print(f"  engine matches SQL: {strip(rows) == strip(sql)}, matrix matches SQL: {strip(matrix) == strip(sql)}")
+
+if __name__ == "__main__":
+    bench_memory()
+    if "--db" in sys.argv:
+        asyncio.run(bench_db())
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend import schemas
+from backend.responses import FastJSONResponse, iter_json_array, ORJSON_AVAILABLE
+from backend.services.cache_codecs import CacheCodec, SERIALIZERS, COMPRESSORS
+
+# Serialization cost per 100k rows for the list endpoints.
+# Usage: python scripts/bench_serialization.py [rows]
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+def make_product_rows(n: int):
+    now = datetime.now()
+    return [
+        {
+            "id": i,
+            "name": f"Product {i}",
+            "category": ["Electronics", "Home", "Office", "Wearables"][i % 4],
+            "price": 19.99 + i % 100,
+            "cost": 9.5 + i % 50,
+            "stock_quantity": i % 250,
+            "sku": f"SKU-{i:06d}",
+            "low_stock_threshold": 10,
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+def make_trend_rows(n: int):
+    start = datetime(2020, 1, 1)
+    return [{"date": str((start + timedelta(days=i)).date()), "revenue": float(i * 13.37)} for i in range(n)]
+
+def timed(label: str, fn, rows: int):
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    per_100k = elapsed * (100_000 / rows)
+    print(f"  {label:<48} {elapsed * 1000:9.1f} ms  ({per_100k * 1000:8.1f} ms / 100k rows, {size / 1e6:6.1f} MB)")
+
+def bench(name: str, rows: list, model=None):
+    print(f"\n{name}: {len(rows):,} rows (orjson available: {ORJSON_AVAILABLE})")
+
+    if model is not None:
+        adapter = TypeAdapter(List[model])
+        timed("pydantic validate + dump_json (response_model)", lambda: len(adapter.dump_json(adapter.validate_python(rows))), len(rows))
+
+    timed("jsonable_encoder + json.dumps (default)", lambda: len(json.dumps(jsonable_encoder(rows)).encode()), len(rows))
+    timed("FastJSONResponse.render", lambda: len(FastJSONResponse(rows).body), len(rows))
+    timed("iter_json_array (streamed chunks)", lambda: sum(len(chunk) for chunk in iter_json_array(rows)), len(rows))
+
+def bench_cache_codecs(name: str, value, repeat: int = 20):
+    # Per-hit cost of a cached payload in Redis: decode time and stored size
+    print(f"\nCache codecs: {name}")
+    for serializer in SERIALIZERS:
+        for compressor in COMPRESSORS:
+            codec = CacheCodec(serializer, compressor)
+            data = codec.encode(value)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                codec.decode(data)
+            decode_ms = (time.perf_counter() - start) / repeat * 1000
+            print(f"  {serializer + ' + ' + compressor:<20} {len(data) / 1024:9.1f} KB  decode {decode_ms:7.2f} ms")
+
+if __name__ == "__main__":
+    bench("Products (/api/products/)", make_product_rows(ROWS), schemas.ProductResponse)
+    bench("Revenue trend (/api/kpis/revenue/trend)", make_trend_rows(ROWS))
+    bench_cache_codecs("365-day revenue trend", make_trend_rows(365))
+    bench_cache_codecs("dataset analysis (100-row preview)", {"preview": jsonable_encoder(make_product_rows(100)), "rows": 100})
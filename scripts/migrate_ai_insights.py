@@ -0,0 +1,23 @@
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+from backend.database import DATABASE_URL
+
+async def migrate():
+    print(f"Connecting to database...")
+    engine = create_async_engine(DATABASE_URL)
+    
+    async with engine.begin() as conn:
+        print("Adding snapshot_hash column...")
+        await conn.execute(text("ALTER TABLE ai_insights ADD COLUMN IF NOT EXISTS snapshot_hash VARCHAR;"))
+
+        print("Creating snapshot_hash index...")
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_ai_insights_snapshot_hash ON ai_insights (snapshot_hash);"
+        ))
+        
+    print("Migration complete!")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,33 @@
+import sys
+import asyncio
+from backend import models
+from backend.database import AsyncSessionLocal, Base, engine
+from backend.services import cohort_service
+
+# One-off backfill of the cohort tables (customer_first_order,
+# customer_active_months, cohort_activity) from the full order history; ingests
+# keep them current afterwards. Run once after deploying them, or whenever the
+# startup check reports they are out of date. --force rebuilds regardless.
+
+async def migrate():
+    print("Connecting to database...")
+    async with engine.begin() as conn:
+        print("Creating cohort tables...")
+        await conn.run_sync(Base.metadata.create_all, tables=[
+            models.CustomerFirstOrder.__table__, models.CustomerActiveMonth.__table__, models.CohortActivity.__table__,
+        ])
+
+    async with AsyncSessionLocal() as session:
+        # Same lock ingests take: waits out concurrent runs and uploads, held until rebuild() commits
+        await cohort_service.lock_for_write(session)
+        if "--force" not in sys.argv and not await cohort_service.needs_rebuild(session):
+            print("Cohort tables are up to date.")
+        else:
+            print("Rebuilding cohort tables from orders...")
+            print(f"Cohort tables rebuilt from {await cohort_service.rebuild(session)} orders")
+
+    print("Migration complete!")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
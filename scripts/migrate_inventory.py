@@ -20,6 +20,12 @@ async def migrate():
         
         print("Adding low_stock_threshold column...")
         await conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS low_stock_threshold INTEGER DEFAULT 10;"))
+
+        print("Creating low-stock partial index...")
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_low_stock ON products (stock_quantity, id) "
+            "WHERE stock_quantity <= low_stock_threshold;"
+        ))
         
     print("Migration complete!")
     await engine.dispose()